@@ -0,0 +1,60 @@
+"""Add soft delete columns
+
+Revision ID: 4e8d1c6b9f20
+Revises: 7b2f4c9e1a3d
+Create Date: 2026-10-19 15:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8d1c6b9f20'
+down_revision = '7b2f4c9e1a3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('item', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_deleted_at', 'user', ['deleted_at'], unique=False,
+            postgresql_where=sa.text('deleted_at IS NOT NULL'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_item_deleted_at', 'item', ['deleted_at'], unique=False,
+            postgresql_where=sa.text('deleted_at IS NOT NULL'),
+            postgresql_concurrently=True,
+        )
+        # Emails only need to be unique among users that aren't deleted
+        op.create_index(
+            'ix_user_email_active', 'user', ['email'], unique=True,
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_user_email', table_name='user', postgresql_concurrently=True)
+
+
+def downgrade():
+    op.execute('DELETE FROM "user" WHERE deleted_at IS NOT NULL')
+    op.execute('DELETE FROM item WHERE deleted_at IS NOT NULL')
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_email', 'user', ['email'], unique=True,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_user_email_active', table_name='user', postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_item_deleted_at', table_name='item', postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_user_deleted_at', table_name='user', postgresql_concurrently=True
+        )
+    op.drop_column('item', 'deleted_at')
+    op.drop_column('user', 'deleted_at')
@@ -0,0 +1,44 @@
+"""Make user emails case insensitive
+
+Revision ID: 5f3d8a2c6e91
+Revises: e93b6f2a4d17
+Create Date: 2026-10-19 18:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f3d8a2c6e91'
+down_revision = 'e93b6f2a4d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fails if active users have the same email in different cases, they have
+    # to be merged or deleted first
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_lower_email_active', 'user', [sa.text('lower(email)')],
+            unique=True,
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_user_email_active', table_name='user', postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_email_active', 'user', ['email'], unique=True,
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_user_lower_email_active', table_name='user',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,31 @@
+"""Add index on item.owner_id
+
+Revision ID: 7b2f4c9e1a3d
+Revises: 1a31ce608336
+Create Date: 2026-10-19 14:20:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2f4c9e1a3d'
+down_revision = '1a31ce608336'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Without it the ON DELETE CASCADE of every deleted user scans the item table
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_item_owner_id'), 'item', ['owner_id'], unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            op.f('ix_item_owner_id'), table_name='item', postgresql_concurrently=True
+        )
@@ -0,0 +1,78 @@
+"""Add item timestamps
+
+Revision ID: a8c4e2f6b0d3
+Revises: 5f3d8a2c6e91
+Create Date: 2026-10-19 19:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8c4e2f6b0d3'
+down_revision = '5f3d8a2c6e91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # now() isn't volatile, the existing rows get the time of the migration
+    # without rewriting the table
+    op.add_column(
+        'item',
+        sa.Column(
+            'created_at', sa.DateTime(timezone=True),
+            server_default=sa.text('now()'), nullable=False,
+        ),
+    )
+    op.add_column(
+        'item',
+        sa.Column(
+            'updated_at', sa.DateTime(timezone=True),
+            server_default=sa.text('now()'), nullable=False,
+        ),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_item_owner_id_created_at', 'item', ['owner_id', 'created_at'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_item_owner_id_updated_at', 'item', ['owner_id', 'updated_at'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_item_created_at', 'item', ['created_at'], unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_item_updated_at', 'item', ['updated_at'], unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_item_lower_title', 'item', [sa.text('lower(title) COLLATE "C"')],
+            unique=False, postgresql_concurrently=True,
+        )
+        # Covered by the owner_id indexes above
+        op.drop_index(
+            'ix_item_owner_id', table_name='item', postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_item_owner_id', 'item', ['owner_id'], unique=False,
+            postgresql_concurrently=True,
+        )
+        for name in [
+            'ix_item_lower_title',
+            'ix_item_updated_at',
+            'ix_item_created_at',
+            'ix_item_owner_id_updated_at',
+            'ix_item_owner_id_created_at',
+        ]:
+            op.drop_index(name, table_name='item', postgresql_concurrently=True)
+    op.drop_column('item', 'updated_at')
+    op.drop_column('item', 'created_at')
@@ -0,0 +1,73 @@
+"""Add item events
+
+Revision ID: b7e1d4a9c2f5
+Revises: a8c4e2f6b0d3
+Create Date: 2026-10-19 20:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e1d4a9c2f5'
+down_revision = 'a8c4e2f6b0d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'item_event',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('item_id', sa.Uuid(), nullable=False),
+        sa.Column('owner_id', sa.Uuid(), nullable=False),
+        sa.Column('type', sqlmodel.sql.sqltypes.AutoString(length=16), nullable=False),
+        sa.Column(
+            'created_at', sa.DateTime(timezone=True),
+            server_default=sa.text('now()'), nullable=False,
+        ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_item_event_owner_id_id', 'item_event', ['owner_id', 'id'], unique=False
+    )
+    op.create_index(
+        'ix_item_event_created_at', 'item_event', ['created_at'], unique=False
+    )
+    op.execute(
+        """
+CREATE OR REPLACE FUNCTION item_event_notify() RETURNS trigger AS $$
+DECLARE
+    event item_event;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO item_event (item_id, owner_id, type)
+        VALUES (NEW.id, NEW.owner_id, 'created') RETURNING * INTO event;
+    ELSIF OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL THEN
+        INSERT INTO item_event (item_id, owner_id, type)
+        VALUES (NEW.id, NEW.owner_id, 'deleted') RETURNING * INTO event;
+    ELSIF NEW.deleted_at IS NULL THEN
+        INSERT INTO item_event (item_id, owner_id, type)
+        VALUES (NEW.id, NEW.owner_id, 'updated') RETURNING * INTO event;
+    ELSE
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('item_events', row_to_json(event)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER item_event AFTER INSERT OR UPDATE ON item
+FOR EACH ROW EXECUTE FUNCTION item_event_notify();
+"""
+    )
+
+
+def downgrade():
+    op.execute('DROP TRIGGER item_event ON item')
+    op.execute('DROP FUNCTION item_event_notify()')
+    op.drop_index('ix_item_event_created_at', table_name='item_event')
+    op.drop_index('ix_item_event_owner_id_id', table_name='item_event')
+    op.drop_table('item_event')
@@ -0,0 +1,33 @@
+"""Add item and user versions
+
+Revision ID: c3e8f1a6d4b9
+Revises: f1c6b3e8a2d7
+Create Date: 2026-10-19 23:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8f1a6d4b9'
+down_revision = 'f1c6b3e8a2d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A constant default, the existing rows aren't rewritten
+    op.add_column(
+        'user',
+        sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False),
+    )
+    op.add_column(
+        'item',
+        sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_column('item', 'version')
+    op.drop_column('user', 'version')
@@ -0,0 +1,47 @@
+"""Add item search vector
+
+Revision ID: c5a1e7d3b8f4
+Revises: 4e8d1c6b9f20
+Create Date: 2026-10-19 17:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a1e7d3b8f4'
+down_revision = '4e8d1c6b9f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A stored generated column rewrites the table, run it in a quiet period
+    op.add_column(
+        'item',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, ''))",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_item_search_vector', 'item', ['search_vector'], unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_item_search_vector', table_name='item', postgresql_concurrently=True
+        )
+    op.drop_column('item', 'search_vector')
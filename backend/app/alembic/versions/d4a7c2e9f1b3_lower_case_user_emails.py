@@ -0,0 +1,28 @@
+"""Lower case user emails
+
+Revision ID: d4a7c2e9f1b3
+Revises: c3e8f1a6d4b9
+Create Date: 2026-10-20 10:15:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7c2e9f1b3'
+down_revision = 'c3e8f1a6d4b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Can't conflict, the unique index is already on lower(email)
+    op.execute(
+        'UPDATE "user" SET email = lower(email), version = version + 1 '
+        'WHERE email <> lower(email)'
+    )
+
+
+def downgrade():
+    # The case emails were entered in isn't kept
+    pass
@@ -0,0 +1,30 @@
+"""Add index on deleted user ids
+
+Revision ID: e6b9d3f2a8c1
+Revises: d4a7c2e9f1b3
+Create Date: 2026-10-20 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b9d3f2a8c1'
+down_revision = 'd4a7c2e9f1b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_user_id_deleted',
+        'user',
+        ['id'],
+        unique=False,
+        postgresql_where=sa.text('deleted_at IS NOT NULL'),
+    )
+
+
+def downgrade():
+    op.drop_index('ix_user_id_deleted', table_name='user')
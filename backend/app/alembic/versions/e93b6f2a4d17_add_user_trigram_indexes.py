@@ -0,0 +1,47 @@
+"""Add user trigram indexes
+
+Revision ID: e93b6f2a4d17
+Revises: c5a1e7d3b8f4
+Create Date: 2026-10-19 18:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e93b6f2a4d17'
+down_revision = 'c5a1e7d3b8f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Trusted extension shipped with Postgres, the database owner can create it
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_email_trgm', 'user', ['email'], unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'email': 'gin_trgm_ops'},
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_user_full_name_trgm', 'user', ['full_name'], unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'full_name': 'gin_trgm_ops'},
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_user_full_name_trgm', table_name='user', postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_user_email_trgm', table_name='user', postgresql_concurrently=True
+        )
+    # The extension is left in place, other objects may use it
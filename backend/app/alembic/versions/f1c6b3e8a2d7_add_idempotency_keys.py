@@ -0,0 +1,43 @@
+"""Add idempotency keys
+
+Revision ID: f1c6b3e8a2d7
+Revises: b7e1d4a9c2f5
+Create Date: 2026-10-19 22:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c6b3e8a2d7'
+down_revision = 'b7e1d4a9c2f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'idempotency_key',
+        sa.Column('scope', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False),
+        sa.Column('key', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column(
+            'request_hash', sqlmodel.sql.sqltypes.AutoString(length=64), nullable=False
+        ),
+        sa.Column('response', postgresql.JSONB(), nullable=False),
+        sa.Column(
+            'created_at', sa.DateTime(timezone=True),
+            server_default=sa.text('now()'), nullable=False,
+        ),
+        sa.PrimaryKeyConstraint('scope', 'key'),
+    )
+    op.create_index(
+        'ix_idempotency_key_created_at', 'idempotency_key', ['created_at'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_idempotency_key_created_at', table_name='idempotency_key')
+    op.drop_table('idempotency_key')
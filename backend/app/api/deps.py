@@ -1,16 +1,21 @@
-from collections.abc import Generator
+import uuid
+from collections.abc import AsyncGenerator, Generator, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
 from typing import Annotated
 
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 from sqlmodel import Session
 
-from app.core import security
+from app.core import profiling, security, single_flight
 from app.core.config import settings
 from app.core.db import engine
+from app.core.timing import phase
 from app.models import TokenPayload, User
 
 reusable_oauth2 = OAuth2PasswordBearer(
@@ -18,16 +23,52 @@ reusable_oauth2 = OAuth2PasswordBearer(
 )
 
 
+@dataclass
+class Batch:
+    session: Session
+    user: User
+
+
+# Set while the sub-requests of a batch run, see app/api/routes/batch.py
+_batch: ContextVar[Batch | None] = ContextVar("batch", default=None)
+
+
+@contextmanager
+def run_in_batch(session: Session, user: User) -> Iterator[None]:
+    """
+    Give the requests run in the block `session` and `user`, instead of their
+    own session and authentication.
+    """
+    token = _batch.set(Batch(session=session, user=user))
+    try:
+        # Reads shared with other requests wouldn't see the batch's changes
+        with single_flight.disabled():
+            yield
+    finally:
+        _batch.reset(token)
+
+
 def get_db() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_db)]
+def get_session(session: Annotated[Session, Depends(get_db)]) -> Session:
+    # Sessions only connect on their first query, the unused one is free
+    batch = _batch.get()
+    return batch.session if batch else session
+
+
+SessionDep = Annotated[Session, Depends(get_session)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 
+@phase("auth")
 def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    batch = _batch.get()
+    if batch:
+        # Authenticated once for the whole batch, with the same token
+        return batch.user
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
@@ -55,3 +96,25 @@ def get_current_active_superuser(current_user: CurrentUser) -> User:
             status_code=403, detail="The user doesn't have enough privileges"
         )
     return current_user
+
+
+async def profile_request(
+    request: Request, response: Response
+) -> AsyncGenerator[None, None]:
+    """
+    Profile the endpoint of requests sent with a valid `X-Profile-Token`, the
+    trace can be downloaded with the id in the `X-Profile-Trace-Id` header.
+    """
+    token = request.headers.get("X-Profile-Token")
+    if not token:
+        yield
+        return
+    if not profiling.verify_profiling_token(token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+    trace_id = uuid.uuid4()
+    response.headers["X-Profile-Trace-Id"] = str(trace_id)
+    with profiling.profile_request(settings.PROFILING_INTERVAL_MS / 1000) as sampler:
+        try:
+            yield
+        finally:
+            profiling.save_trace(trace_id, sampler.stacks)
@@ -0,0 +1,87 @@
+"""
+Replay the response to a request retried with the same `Idempotency-Key`.
+
+The response is saved in the transaction that creates the resource, so a retry
+either finds it, or finds nothing and runs the request again. Of two requests
+with the same key running concurrently, the second blocks on the key until the
+first commits, then rolls back and replays the first's response.
+"""
+
+import hashlib
+import hmac
+from datetime import datetime, timedelta, timezone
+from typing import Annotated
+
+from fastapi import Header, HTTPException
+from fastapi.responses import JSONResponse
+from sqlmodel import Session, SQLModel
+
+from app import crud
+from app.core.config import settings
+from app.models import IdempotencyKey
+
+IdempotencyKeyHeader = Annotated[
+    str | None, Header(alias="Idempotency-Key", min_length=1, max_length=255)
+]
+
+
+def _expired_before() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(
+        seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS
+    )
+
+
+def _request_hash(request: SQLModel) -> str:
+    # Keyed, the body of a signup has the password
+    return hmac.new(
+        settings.SECRET_KEY.encode(),
+        request.model_dump_json().encode(),
+        hashlib.sha256,
+    ).hexdigest()
+
+
+def replay(
+    *, session: Session, scope: str, key: str, request: SQLModel
+) -> JSONResponse | None:
+    """
+    The saved response to the request with `key`, or None if there's none.
+
+    Raises a 422 if the key was used for a request with another body.
+    """
+    saved = crud.get_idempotency_key(
+        session=session, scope=scope, key=key, created_after=_expired_before()
+    )
+    if not saved:
+        return None
+    if not hmac.compare_digest(saved.request_hash, _request_hash(request)):
+        raise HTTPException(
+            status_code=422,
+            detail="The Idempotency-Key was used for another request",
+        )
+    return JSONResponse(saved.response, headers={"Idempotent-Replayed": "true"})
+
+
+def save(
+    *, session: Session, scope: str, key: str, request: SQLModel, response: SQLModel
+) -> JSONResponse | None:
+    """
+    Save the response with the changes of the session, before they're
+    committed.
+
+    If another request saved the key first, roll back the session and return
+    the other response instead.
+    """
+    idempotency_key = IdempotencyKey(
+        scope=scope,
+        key=key,
+        request_hash=_request_hash(request),
+        response=response.model_dump(mode="json"),
+    )
+    if crud.try_save_idempotency_key(
+        session=session,
+        idempotency_key=idempotency_key,
+        expired_before=_expired_before(),
+    ):
+        return None
+    session.rollback()
+    return replay(session=session, scope=scope, key=key, request=request)
@@ -1,13 +1,16 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
-from app.api.routes import items, login, private, users, utils
+from app.api.deps import profile_request
+from app.api.routes import batch, items, login, private, profiling, users, utils
 from app.core.config import settings
 
-api_router = APIRouter()
+api_router = APIRouter(dependencies=[Depends(profile_request)])
 api_router.include_router(login.router)
 api_router.include_router(users.router)
 api_router.include_router(utils.router)
 api_router.include_router(items.router)
+api_router.include_router(profiling.router)
+api_router.include_router(batch.router)
 
 
 if settings.ENVIRONMENT == "local":
@@ -0,0 +1,48 @@
+"""
+Optimistic concurrency control of item and user updates.
+
+Items and users have a version, incremented by every update and returned as
+their `ETag`. An update is `UPDATE ... WHERE version = <the version loaded>`:
+when another request changed the row in between, it updates nothing and the
+request fails with a 409, without any row being locked while it runs. A client
+sending the `ETag` it read in `If-Match` gets a 412 if the row changed since.
+"""
+
+from typing import Annotated
+
+from fastapi import Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+
+IfMatchHeader = Annotated[str | None, Header(alias="If-Match")]
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def set_etag(response: Response, version: int) -> None:
+    response.headers["ETag"] = etag(version)
+
+
+def check_if_match(if_match: str | None, version: int) -> None:
+    """
+    Raise a 412 if `If-Match` was sent and none of its tags is the current one.
+
+    The comparison is strong, weak `W/` tags never match.
+    """
+    if if_match is None:
+        return
+    tags = {tag.strip() for tag in if_match.split(",")}
+    if "*" in tags or etag(version) in tags:
+        return
+    raise HTTPException(
+        status_code=412, detail="The resource was changed since it was read"
+    )
+
+
+async def stale_data_handler(_request: Request, _exc: Exception) -> JSONResponse:
+    # The UPDATE ... WHERE version = ... of the request found another version
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "The resource was changed by another request, retry"},
+    )
@@ -0,0 +1,148 @@
+import json
+from typing import Any
+
+from fastapi import APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+from sqlmodel import Session
+from starlette.datastructures import Headers
+from starlette.routing import Match
+from starlette.types import Message as ASGIMessage
+from starlette.types import Scope
+
+from app.api.deps import CurrentUser, SessionDep, run_in_batch
+from app.core.config import settings
+from app.core.timing import TimedRoute
+from app.models import (
+    BATCH_REQUEST_HEADERS,
+    BatchRequest,
+    BatchRequests,
+    BatchResponse,
+    BatchResponses,
+)
+
+router = APIRouter(prefix="/batch", tags=["batch"], route_class=TimedRoute)
+
+
+def _error(status: int, detail: str) -> BatchResponse:
+    return BatchResponse(status=status, body={"detail": detail})
+
+
+async def run_request(request: Request, sub_request: BatchRequest) -> BatchResponse:
+    """
+    Run `sub_request` through the routes of the API, in this process, with its
+    own headers and the headers of `request` that authenticate it.
+    """
+    path, _, query_string = sub_request.path.partition("?")
+    path = f"{settings.API_V1_STR}{path}"
+    headers = [(b"content-type", b"application/json")]
+    if authorization := request.headers.get("Authorization"):
+        headers.append((b"authorization", authorization.encode()))
+    for name, value in sub_request.headers.items():
+        # Refused rather than dropped, an If-Match left out would overwrite
+        if name.lower() not in BATCH_REQUEST_HEADERS:
+            return _error(400, f"Header not allowed in a batch: {name}")
+        headers.append((name.lower().encode(), value.encode()))
+    scope: Scope = {
+        **request.scope,
+        "method": sub_request.method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "headers": headers,
+    }
+
+    method_mismatch = False
+    for route in request.app.router.routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            break
+        method_mismatch = method_mismatch or match == Match.PARTIAL
+    else:
+        if method_mismatch:
+            return _error(405, "Method Not Allowed")
+        return _error(404, "Not Found")
+    # Nested batches and streams that never end
+    if (
+        not isinstance(route, APIRoute)
+        or route.endpoint is batch
+        or route.response_class is StreamingResponse
+    ):
+        return _error(400, "Not allowed in a batch")
+    scope.update(child_scope)
+
+    body = b"" if sub_request.body is None else json.dumps(sub_request.body).encode()
+    received = False
+
+    async def receive() -> ASGIMessage:
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    start: ASGIMessage = {}
+    chunks: list[bytes] = []
+
+    async def send(message: ASGIMessage) -> None:
+        nonlocal start
+        if message["type"] == "http.response.start":
+            start = message
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await route.handle(scope, receive, send)
+    content = b"".join(chunks).decode()
+    content_type = Headers(raw=start["headers"]).get("content-type", "")
+    return BatchResponse(
+        status=start["status"],
+        body=json.loads(content)
+        if content and content_type.startswith("application/json")
+        else content or None,
+    )
+
+
+@router.post("/", response_model=BatchResponses)
+async def batch(
+    request: Request,
+    session: SessionDep,
+    current_user: CurrentUser,
+    batch_in: BatchRequests,
+) -> Any:
+    """
+    Run several requests to the API in order, with one authentication and one
+    database session.
+
+    With `atomic`, the requests share a transaction: the responses stop at the
+    first request that fails and none of the changes are kept.
+    """
+    responses: list[BatchResponse] = []
+    if not batch_in.atomic:
+        with run_in_batch(session, current_user):
+            for sub_request in batch_in.requests:
+                response = await run_request(request, sub_request)
+                responses.append(response)
+                if response.status >= 400:
+                    # Don't commit what the failed request left in the session
+                    await run_in_threadpool(session.rollback)
+        return BatchResponses(responses=responses)
+
+    # The commits of the requests only release a SAVEPOINT of the transaction
+    connection = await run_in_threadpool(session.connection)
+    batch_session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        user = batch_session.merge(current_user, load=False)
+        with run_in_batch(batch_session, user):
+            for sub_request in batch_in.requests:
+                response = await run_request(request, sub_request)
+                responses.append(response)
+                if response.status >= 400:
+                    break
+    finally:
+        await run_in_threadpool(batch_session.close)
+    if responses[-1].status >= 400:
+        await run_in_threadpool(session.rollback)
+    else:
+        await run_in_threadpool(session.commit)
+    return BatchResponses(responses=responses)
@@ -1,48 +1,258 @@
+import asyncio
+import base64
+import binascii
+import json
 import uuid
-from typing import Any
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Any, Literal
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import REAL, Uuid, any_, bindparam, cast, literal, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, REGCONFIG
+from sqlmodel import col, func, select
 
+from app import crud
+from app.api import idempotency
 from app.api.deps import CurrentUser, SessionDep
-from app.models import Item, ItemCreate, ItemPublic, ItemsPublic, ItemUpdate, Message
+from app.api.idempotency import IdempotencyKeyHeader
+from app.api.preconditions import IfMatchHeader, check_if_match, set_etag
+from app.core import item_events
+from app.core.config import settings
+from app.core.single_flight import SingleFlight
+from app.core.timing import TimedRoute
+from app.models import (
+    ITEM_SEARCH_CONFIG,
+    Item,
+    ItemCreate,
+    ItemEventPublic,
+    ItemPublic,
+    ItemsBatchGet,
+    ItemsBatchPublic,
+    ItemsPublic,
+    ItemsSearchPublic,
+    ItemUpdate,
+    Message,
+)
+from app.utils import escape_like
 
-router = APIRouter(prefix="/items", tags=["items"])
+router = APIRouter(prefix="/items", tags=["items"], route_class=TimedRoute)
+read_items_flight = SingleFlight(f"{settings.API_V1_STR}/items/")
+
+
+# Sorts of the item list, "-" sorts in descending order
+ItemSort = Literal[
+    "created_at", "-created_at", "updated_at", "-updated_at", "title", "-title"
+]
+ITEM_SORT_COLUMNS: dict[str, Any] = {
+    "created_at": col(Item.created_at),
+    "updated_at": col(Item.updated_at),
+    # Matches the expression of ix_item_lower_title
+    "title": func.lower(Item.title).collate("C"),
+}
 
 
 @router.get("/", response_model=ItemsPublic)
 def read_items(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+    session: SessionDep,
+    current_user: CurrentUser,
+    skip: int = 0,
+    limit: int = 100,
+    title: str | None = Query(default=None, min_length=1, max_length=255),
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    updated_after: datetime | None = None,
+    updated_before: datetime | None = None,
+    owner_id: uuid.UUID | None = None,
+    sort: ItemSort = "-created_at",
 ) -> Any:
     """
     Retrieve items.
+
+    `title` matches the start of titles, in any case. The time ranges include
+    `*_after` and exclude `*_before`. Only superusers can filter by `owner_id`,
+    other users only get their own items.
     """
+    if not current_user.is_superuser:
+        if owner_id and owner_id != current_user.id:
+            raise HTTPException(status_code=400, detail="Not enough permissions")
+        owner_id = current_user.id
 
-    if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Item)
-        count = session.exec(count_statement).one()
-        statement = select(Item).offset(skip).limit(limit)
-        items = session.exec(statement).all()
-    else:
-        count_statement = (
-            select(func.count())
-            .select_from(Item)
-            .where(Item.owner_id == current_user.id)
-        )
+    def read() -> ItemsPublic:
+        filters = []
+        if owner_id:
+            filters.append(col(Item.owner_id) == owner_id)
+        if title:
+            filters.append(
+                ITEM_SORT_COLUMNS["title"].like(func.lower(f"{escape_like(title)}%"))
+            )
+        if created_after:
+            filters.append(col(Item.created_at) >= created_after)
+        if created_before:
+            filters.append(col(Item.created_at) < created_before)
+        if updated_after:
+            filters.append(col(Item.updated_at) >= updated_after)
+        if updated_before:
+            filters.append(col(Item.updated_at) < updated_before)
+
+        count_statement = select(func.count()).select_from(Item).where(*filters)
         count = session.exec(count_statement).one()
+
+        sort_column = ITEM_SORT_COLUMNS[sort.removeprefix("-")]
+        if sort.startswith("-"):
+            order_by = (sort_column.desc(), col(Item.id).desc())
+        else:
+            order_by = (sort_column.asc(), col(Item.id).asc())
         statement = (
-            select(Item)
-            .where(Item.owner_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
+            select(Item).where(*filters).order_by(*order_by).offset(skip).limit(limit)
         )
         items = session.exec(statement).all()
 
-    return ItemsPublic(data=items, count=count)
+        return ItemsPublic(data=items, count=count)
+
+    # The owner is part of the key, users only share the reads of their items
+    key = (
+        skip,
+        limit,
+        title,
+        created_after,
+        created_before,
+        updated_after,
+        updated_before,
+        owner_id,
+        sort,
+    )
+    return read_items_flight.do(key, read)
+
+
+@router.post("/batch-get", response_model=ItemsBatchPublic)
+def batch_get_items(
+    session: SessionDep, current_user: CurrentUser, body: ItemsBatchGet
+) -> Any:
+    """
+    Get the items with the given IDs.
+
+    IDs of items that don't exist or that belong to another user are returned
+    in `missing`, the same way.
+    """
+    ids = list(dict.fromkeys(body.ids))
+    # A single array parameter, whatever the number of ids
+    statement = select(Item).where(
+        col(Item.id) == any_(bindparam("ids", ids, type_=ARRAY(Uuid)))
+    )
+    if not current_user.is_superuser:
+        statement = statement.where(col(Item.owner_id) == current_user.id)
+    found = {item.id: item for item in session.exec(statement).all()}
+    return ItemsBatchPublic(
+        data=[found[id] for id in ids if id in found],
+        missing=[id for id in ids if id not in found],
+    )
+
+
+def encode_search_cursor(rank: float, id: uuid.UUID) -> str:
+    return base64.urlsafe_b64encode(json.dumps([rank, str(id)]).encode()).decode()
+
+
+def decode_search_cursor(cursor: str) -> tuple[float, uuid.UUID]:
+    try:
+        rank, id = json.loads(base64.urlsafe_b64decode(cursor))
+        return float(rank), uuid.UUID(id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/search", response_model=ItemsSearchPublic)
+def search_items(
+    session: SessionDep,
+    current_user: CurrentUser,
+    q: str = Query(min_length=1, max_length=255),
+    cursor: str | None = None,
+    limit: int = Query(default=20, ge=1, le=100),
+) -> Any:
+    """
+    Search items by title and description, best matches first.
+
+    `q` takes words, "quoted phrases", OR and -excluded words.
+    """
+    search_vector = Item.__table__.c.search_vector  # type: ignore[attr-defined]
+    query = func.websearch_to_tsquery(cast(ITEM_SEARCH_CONFIG, REGCONFIG), q)
+    rank = func.ts_rank(search_vector, query)
+    statement = select(Item, rank).where(search_vector.op("@@")(query))
+    if not current_user.is_superuser:
+        statement = statement.where(Item.owner_id == current_user.id)
+    if cursor:
+        last_rank, last_id = decode_search_cursor(cursor)
+        # ts_rank() is a real, compare with the rank as it was returned
+        statement = statement.where(
+            tuple_(rank, col(Item.id)) < tuple_(cast(last_rank, REAL), literal(last_id))
+        )
+    statement = statement.order_by(rank.desc(), col(Item.id).desc()).limit(limit + 1)
+    rows = session.exec(statement).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        last_item, last_rank = rows[limit - 1]
+        next_cursor = encode_search_cursor(last_rank, last_item.id)
+    return ItemsSearchPublic(
+        data=[item for item, _ in rows[:limit]], next_cursor=next_cursor
+    )
+
+
+@router.get("/events", response_class=StreamingResponse)
+async def stream_item_events(
+    session: SessionDep,
+    current_user: CurrentUser,
+    last_event_id: Annotated[int | None, Header()] = None,
+) -> StreamingResponse:
+    """
+    Stream the creation, update and deletion of items as server-sent events.
+
+    Reconnect with the `Last-Event-ID` header to get the events missed since,
+    after a `reset` event reload the items instead. Events are sent in commit
+    order, so the replay starts a little before that id: skip the events
+    already received.
+    """
+    owner_id = None if current_user.is_superuser else current_user.id
+    try:
+        subscription = await item_events.broker.subscribe(owner_id)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Item events are unavailable")
+
+    def read_missed_events() -> tuple[list[ItemEventPublic], int | None]:
+        if last_event_id is None:
+            return [], None
+        limit = settings.ITEM_EVENTS_REPLAY_LIMIT
+        events = crud.get_item_events(
+            session=session,
+            owner_id=owner_id,
+            after_id=last_event_id,
+            limit=limit + 1,
+            overlap=timedelta(seconds=settings.ITEM_EVENTS_REPLAY_OVERLAP_SECONDS),
+        )
+        if len(events) > limit:
+            return [], crud.get_last_item_event_id(session=session, owner_id=owner_id)
+        return [ItemEventPublic.model_validate(event) for event in events], None
+
+    try:
+        replayed, reset_id = await run_in_threadpool(read_missed_events)
+    except BaseException:
+        item_events.broker.unsubscribe(subscription)
+        raise
+    finally:
+        # Don't hold a database connection for as long as the stream is open
+        session.close()
+    return StreamingResponse(
+        item_events.stream(subscription, replayed, reset_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{id}", response_model=ItemPublic)
-def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+def read_item(
+    session: SessionDep, current_user: CurrentUser, id: uuid.UUID, response: Response
+) -> Any:
     """
     Get item by ID.
     """
@@ -51,18 +261,43 @@ def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) ->
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    set_etag(response, item.version)
     return item
 
 
 @router.post("/", response_model=ItemPublic)
 def create_item(
-    *, session: SessionDep, current_user: CurrentUser, item_in: ItemCreate
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    item_in: ItemCreate,
+    idempotency_key: IdempotencyKeyHeader = None,
 ) -> Any:
     """
     Create new item.
+
+    A retry with the same `Idempotency-Key` gets the response to the first
+    request, without creating the item again.
     """
+    scope = f"items.create:{current_user.id}"
+    if idempotency_key and (
+        replayed := idempotency.replay(
+            session=session, scope=scope, key=idempotency_key, request=item_in
+        )
+    ):
+        return replayed
     item = Item.model_validate(item_in, update={"owner_id": current_user.id})
     session.add(item)
+    if idempotency_key:
+        session.flush()
+        if replayed := idempotency.save(
+            session=session,
+            scope=scope,
+            key=idempotency_key,
+            request=item_in,
+            response=ItemPublic.model_validate(item),
+        ):
+            return replayed
     session.commit()
     session.refresh(item)
     return item
@@ -75,35 +310,51 @@ def update_item(
     current_user: CurrentUser,
     id: uuid.UUID,
     item_in: ItemUpdate,
+    response: Response,
+    if_match: IfMatchHeader = None,
 ) -> Any:
     """
     Update an item.
+
+    With `If-Match`, the item is only updated if its `ETag` is still the one
+    sent, or a 412 is returned.
     """
     item = session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
+    check_if_match(if_match, item.version)
     update_dict = item_in.model_dump(exclude_unset=True)
     item.sqlmodel_update(update_dict)
     session.add(item)
     session.commit()
     session.refresh(item)
+    set_etag(response, item.version)
     return item
 
 
 @router.delete("/{id}")
 def delete_item(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+    session: SessionDep,
+    current_user: CurrentUser,
+    id: uuid.UUID,
+    if_match: IfMatchHeader = None,
 ) -> Message:
     """
     Delete an item.
+
+    With `If-Match`, the item is only deleted if its `ETag` is still the one
+    sent, or a 412 is returned.
     """
     item = session.get(Item, id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    session.delete(item)
+    check_if_match(if_match, item.version)
+    # Removed from the table by app/purge.py
+    item.deleted_at = datetime.now(timezone.utc)
+    session.add(item)
     session.commit()
     return Message(message="Item deleted successfully")
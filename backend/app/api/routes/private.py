@@ -1,16 +1,17 @@
 from typing import Any
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from app import crud
 from app.api.deps import SessionDep
-from app.core.security import get_password_hash
+from app.core.timing import TimedRoute
 from app.models import (
-    User,
+    UserCreate,
     UserPublic,
 )
 
-router = APIRouter(tags=["private"], prefix="/private")
+router = APIRouter(tags=["private"], prefix="/private", route_class=TimedRoute)
 
 
 class PrivateUserCreate(BaseModel):
@@ -26,13 +27,16 @@ def create_user(user_in: PrivateUserCreate, session: SessionDep) -> Any:
     Create a new user.
     """
 
-    user = User(
+    user_create = UserCreate(
         email=user_in.email,
         full_name=user_in.full_name,
-        hashed_password=get_password_hash(user_in.password),
+        password=user_in.password,
     )
-
-    session.add(user)
-    session.commit()
+    user = crud.try_create_user(session=session, user_create=user_create)
+    if not user:
+        raise HTTPException(
+            status_code=400,
+            detail="The user with this email already exists in the system",
+        )
 
     return user
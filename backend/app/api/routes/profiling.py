@@ -0,0 +1,69 @@
+import os
+import uuid
+from datetime import timedelta
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.api.deps import get_current_active_superuser
+from app.core import profiling
+from app.core.config import settings
+from app.core.timing import TimedRoute
+from app.models import Token
+
+router = APIRouter(
+    prefix="/profiling",
+    tags=["profiling"],
+    dependencies=[Depends(get_current_active_superuser)],
+    route_class=TimedRoute,
+)
+
+
+@router.post("/cpu", response_class=PlainTextResponse)
+def profile_cpu(
+    seconds: float = Query(default=10, gt=0, le=settings.PROFILING_MAX_SECONDS),
+    interval_ms: float = Query(default=settings.PROFILING_INTERVAL_MS, ge=1),
+) -> Any:
+    """
+    Sample the stacks of the worker that handles this request for `seconds`.
+
+    Returns the collapsed stacks, ready for flamegraph.pl or speedscope.
+    """
+    stacks = profiling.profile_worker(seconds, interval_ms / 1000)
+    if stacks is None:
+        raise HTTPException(
+            status_code=409, detail="A profile is already running on this worker"
+        )
+    return PlainTextResponse(
+        stacks,
+        headers={
+            "Content-Disposition": f'attachment; filename="cpu-{os.getpid()}.folded"'
+        },
+    )
+
+
+@router.post("/token")
+def create_profiling_token() -> Token:
+    """
+    Token to send in the `X-Profile-Token` header of requests to profile.
+    """
+    expires_delta = timedelta(minutes=settings.PROFILING_TOKEN_EXPIRE_MINUTES)
+    return Token(
+        access_token=profiling.create_profiling_token(expires_delta),
+        token_type="profiling",
+    )
+
+
+@router.get("/traces/{trace_id}", response_class=PlainTextResponse)
+def read_trace(trace_id: uuid.UUID) -> Any:
+    """
+    Collapsed stacks of a profiled request, by its `X-Profile-Trace-Id`.
+    """
+    trace = profiling.load_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return PlainTextResponse(
+        trace,
+        headers={"Content-Disposition": f'attachment; filename="{trace_id}.folded"'},
+    )
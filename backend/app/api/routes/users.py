@@ -1,19 +1,24 @@
 import uuid
+from datetime import datetime, timezone
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import col, delete, func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlmodel import col, func, literal, or_, select
 
 from app import crud
+from app.api import idempotency
 from app.api.deps import (
     CurrentUser,
     SessionDep,
     get_current_active_superuser,
 )
+from app.api.idempotency import IdempotencyKeyHeader
+from app.api.preconditions import IfMatchHeader, check_if_match, set_etag
 from app.core.config import settings
 from app.core.security import get_password_hash, verify_password
+from app.core.single_flight import SingleFlight
+from app.core.timing import TimedRoute
 from app.models import (
-    Item,
     Message,
     UpdatePassword,
     User,
@@ -24,9 +29,10 @@ from app.models import (
     UserUpdate,
     UserUpdateMe,
 )
-from app.utils import generate_new_account_email, send_email
+from app.utils import escape_like, generate_new_account_email, send_email
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=TimedRoute)
+read_users_flight = SingleFlight(f"{settings.API_V1_STR}/users/")
 
 
 @router.get(
@@ -34,18 +40,46 @@ router = APIRouter(prefix="/users", tags=["users"])
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UsersPublic,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+def read_users(
+    session: SessionDep,
+    skip: int = 0,
+    limit: int = 100,
+    q: str | None = Query(default=None, min_length=1, max_length=255),
+) -> Any:
     """
     Retrieve users.
+
+    `q` searches emails and full names, closest matches first, small typos
+    still match.
     """
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
+    def read() -> UsersPublic:
+        count_statement = select(func.count()).select_from(User)
+        statement = select(User)
+        if q:
+            # Served by the trigram indexes on email and full_name
+            term = literal(q)
+            match = or_(
+                col(User.email).ilike(f"{escape_like(q)}%"),
+                term.op("<%")(User.email),
+                term.op("<%")(User.full_name),
+            )
+            count_statement = count_statement.where(match)
+            statement = statement.where(match).order_by(
+                func.greatest(
+                    func.word_similarity(term, User.email),
+                    func.word_similarity(term, func.coalesce(User.full_name, "")),
+                ).desc(),
+                col(User.email),
+            )
+        count = session.exec(count_statement).one()
+
+        statement = statement.offset(skip).limit(limit)
+        users = session.exec(statement).all()
 
-    statement = select(User).offset(skip).limit(limit)
-    users = session.exec(statement).all()
+        return UsersPublic(data=users, count=count)
 
-    return UsersPublic(data=users, count=count)
+    return read_users_flight.do((skip, limit, q), read)
 
 
 @router.post(
@@ -55,14 +89,12 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
     """
     Create new user.
     """
-    user = crud.get_user_by_email(session=session, email=user_in.email)
-    if user:
+    user = crud.try_create_user(session=session, user_create=user_in)
+    if not user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system.",
         )
-
-    user = crud.create_user(session=session, user_create=user_in)
     if settings.emails_enabled and user_in.email:
         email_data = generate_new_account_email(
             email_to=user_in.email, username=user_in.email, password=user_in.password
@@ -77,12 +109,20 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
 
 @router.patch("/me", response_model=UserPublic)
 def update_user_me(
-    *, session: SessionDep, user_in: UserUpdateMe, current_user: CurrentUser
+    *,
+    session: SessionDep,
+    user_in: UserUpdateMe,
+    current_user: CurrentUser,
+    response: Response,
+    if_match: IfMatchHeader = None,
 ) -> Any:
     """
     Update own user.
-    """
 
+    With `If-Match`, the user is only updated if its `ETag` is still the one
+    sent, or a 412 is returned.
+    """
+    check_if_match(if_match, current_user.version)
     if user_in.email:
         existing_user = crud.get_user_by_email(session=session, email=user_in.email)
         if existing_user and existing_user.id != current_user.id:
@@ -94,6 +134,7 @@ def update_user_me(
     session.add(current_user)
     session.commit()
     session.refresh(current_user)
+    set_etag(response, current_user.version)
     return current_user
 
 
@@ -118,10 +159,11 @@ def update_password_me(
 
 
 @router.get("/me", response_model=UserPublic)
-def read_user_me(current_user: CurrentUser) -> Any:
+def read_user_me(current_user: CurrentUser, response: Response) -> Any:
     """
     Get current user.
     """
+    set_etag(response, current_user.version)
     return current_user
 
 
@@ -134,35 +176,74 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
-    session.delete(current_user)
+    # Removed with its items by app/purge.py
+    current_user.deleted_at = datetime.now(timezone.utc)
+    session.add(current_user)
     session.commit()
     return Message(message="User deleted successfully")
 
 
 @router.post("/signup", response_model=UserPublic)
-def register_user(session: SessionDep, user_in: UserRegister) -> Any:
+def register_user(
+    session: SessionDep,
+    user_in: UserRegister,
+    idempotency_key: IdempotencyKeyHeader = None,
+) -> Any:
     """
     Create new user without the need to be logged in.
+
+    A retry with the same `Idempotency-Key` gets the response to the first
+    request, without creating the user again.
     """
-    user = crud.get_user_by_email(session=session, email=user_in.email)
-    if user:
+    scope = "users.signup"
+    if idempotency_key and (
+        replayed := idempotency.replay(
+            session=session, scope=scope, key=idempotency_key, request=user_in
+        )
+    ):
+        return replayed
+    user_create = UserCreate.model_validate(user_in)
+    user = crud.insert_user(session=session, user_create=user_create)
+    if not user:
+        # A concurrent retry may have just created the user
+        if idempotency_key and (
+            replayed := idempotency.replay(
+                session=session, scope=scope, key=idempotency_key, request=user_in
+            )
+        ):
+            return replayed
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system",
         )
-    user_create = UserCreate.model_validate(user_in)
-    user = crud.create_user(session=session, user_create=user_create)
+    if idempotency_key and (
+        replayed := idempotency.save(
+            session=session,
+            scope=scope,
+            key=idempotency_key,
+            request=user_in,
+            response=UserPublic.model_validate(user),
+        )
+    ):
+        return replayed
+    session.commit()
+    session.refresh(user)
     return user
 
 
 @router.get("/{user_id}", response_model=UserPublic)
 def read_user_by_id(
-    user_id: uuid.UUID, session: SessionDep, current_user: CurrentUser
+    user_id: uuid.UUID,
+    session: SessionDep,
+    current_user: CurrentUser,
+    response: Response,
 ) -> Any:
     """
     Get a specific user by id.
     """
     user = session.get(User, user_id)
+    if user:
+        set_etag(response, user.version)
     if user == current_user:
         return user
     if not current_user.is_superuser:
@@ -183,9 +264,14 @@ def update_user(
     session: SessionDep,
     user_id: uuid.UUID,
     user_in: UserUpdate,
+    response: Response,
+    if_match: IfMatchHeader = None,
 ) -> Any:
     """
     Update a user.
+
+    With `If-Match`, the user is only updated if its `ETag` is still the one
+    sent, or a 412 is returned.
     """
 
     db_user = session.get(User, user_id)
@@ -194,6 +280,7 @@ def update_user(
             status_code=404,
             detail="The user with this id does not exist in the system",
         )
+    check_if_match(if_match, db_user.version)
     if user_in.email:
         existing_user = crud.get_user_by_email(session=session, email=user_in.email)
         if existing_user and existing_user.id != user_id:
@@ -201,8 +288,9 @@ def update_user(
                 status_code=409, detail="User with this email already exists"
             )
 
-    db_user = crud.update_user(session=session, db_user=db_user, user_in=user_in)
-    return db_user
+    user = crud.update_user(session=session, db_user=db_user, user_in=user_in)
+    set_etag(response, user.version)
+    return user
 
 
 @router.delete("/{user_id}", dependencies=[Depends(get_current_active_superuser)])
@@ -219,8 +307,7 @@ def delete_user(
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
-    statement = delete(Item).where(col(Item.owner_id) == user_id)
-    session.exec(statement)  # type: ignore
-    session.delete(user)
+    user.deleted_at = datetime.now(timezone.utc)
+    session.add(user)
     session.commit()
     return Message(message="User deleted successfully")
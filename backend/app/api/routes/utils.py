@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends
+from typing import Any
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
-from app.models import Message
+from app.core import health, metrics, slow_queries
+from app.core.db import engine
+from app.core.timing import TimedRoute
+from app.models import HealthStatus, Message, SlowQueriesPublic
 from app.utils import generate_test_email, send_email
 
-router = APIRouter(prefix="/utils", tags=["utils"])
+router = APIRouter(prefix="/utils", tags=["utils"], route_class=TimedRoute)
 
 
 @router.post(
@@ -29,3 +35,49 @@ def test_email(email_to: EmailStr) -> Message:
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get("/health-check/live/")
+async def liveness() -> bool:
+    """
+    The worker is up and serving requests.
+    """
+    return True
+
+
+@router.get(
+    "/health-check/ready/",
+    response_model=HealthStatus,
+    responses={503: {"model": HealthStatus}},
+)
+def readiness() -> JSONResponse:
+    """
+    The worker can take traffic: the database answers quickly and the
+    connection pool isn't saturated. Responds with 503 otherwise.
+    """
+    status = health.check_readiness(engine)
+    return JSONResponse(
+        status_code=200 if status.ready else 503, content=status.model_dump()
+    )
+
+
+@router.get("/metrics/", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics() -> str:
+    """
+    Prometheus metrics, aggregated over all the workers.
+    """
+    return metrics.render()
+
+
+@router.get(
+    "/slow-queries/",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=SlowQueriesPublic,
+)
+def read_slow_queries(limit: int = Query(default=10, ge=1, le=100)) -> Any:
+    """
+    Statements of this worker that took the most time over the slow query
+    threshold.
+    """
+    queries = slow_queries.top_slow_queries(limit)
+    return SlowQueriesPublic(data=queries, count=len(queries))
@@ -1,32 +1,21 @@
 import logging
 
 from sqlalchemy import Engine
-from sqlmodel import Session, select
-from tenacity import after_log, before_log, retry, stop_after_attempt, wait_fixed
 
+from app.core.config import settings
 from app.core.db import engine
+from app.core.readiness import Check, database_check, smtp_check, wait_until_ready
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-max_tries = 60 * 5  # 5 minutes
-wait_seconds = 1
 
-
-@retry(
-    stop=stop_after_attempt(max_tries),
-    wait=wait_fixed(wait_seconds),
-    before=before_log(logger, logging.INFO),
-    after=after_log(logger, logging.WARN),
-)
 def init(db_engine: Engine) -> None:
-    try:
-        with Session(db_engine) as session:
-            # Try to create session to check if DB is awake
-            session.exec(select(1))
-    except Exception as e:
-        logger.error(e)
-        raise e
+    # Migrations run after this, see scripts/prestart.sh
+    checks: list[Check] = [database_check(db_engine)]
+    if settings.emails_enabled:
+        checks.append(smtp_check())
+    wait_until_ready(checks)
 
 
 def main() -> None:
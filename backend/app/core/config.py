@@ -50,6 +50,54 @@ class Settings(BaseSettings):
 
     PROJECT_NAME: str
     SENTRY_DSN: HttpUrl | None = None
+    # Fraction of requests that get a Server-Timing header and timing log line
+    SERVER_TIMING_SAMPLE_RATE: float = 0.1
+    # Executions of the same statement in one request that get logged as N+1
+    QUERY_REPEAT_THRESHOLD: int = 5
+    # Shared directory to aggregate metrics of multiple workers, unset for one
+    METRICS_MULTIPROC_DIR: str | None = None
+    METRICS_FLUSH_SECONDS: float = 5.0
+    READINESS_CACHE_SECONDS: float = 2.0
+    # The tests wait for the latest Alembic revision, False with create_all
+    TESTS_WAIT_FOR_MIGRATIONS: bool = True
+    READINESS_MAX_DB_LATENCY_MS: float = 250.0
+    # Fraction of the pool (including overflow) in use before we stop being ready
+    READINESS_MAX_POOL_USAGE: float = 0.9
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    # Plans of slow SELECTs are captured with EXPLAIN ANALYZE, re-running them
+    SLOW_QUERY_EXPLAIN_ANALYZE: bool = False
+    # Each worker writes to this path with its pid added before the extension
+    SLOW_QUERY_LOG_FILE: str | None = None
+    SLOW_QUERY_LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUP_COUNT: int = 5
+    PROFILING_INTERVAL_MS: float = 5.0
+    PROFILING_MAX_SECONDS: int = 60
+    PROFILING_TOKEN_EXPIRE_MINUTES: int = 15
+    PROFILING_DIR: str = "/tmp/profiles"
+    # Only the newest traces are kept in PROFILING_DIR
+    PROFILING_MAX_TRACES: int = 100
+    # Deleted users and items are kept this long before app/purge.py removes them
+    PURGE_RETENTION_SECONDS: int = 0
+    PURGE_INTERVAL_SECONDS: int = 60
+    PURGE_BATCH_SIZE: int = 1000
+    PURGE_BATCH_PAUSE_SECONDS: float = 0.1
+    PURGE_LOCK_TIMEOUT_MS: int = 1000
+    # Item events are kept this long for SSE streams to resume from
+    ITEM_EVENTS_RETENTION_SECONDS: int = 60 * 60 * 24
+    # Events buffered for a stream, a client that falls further behind is
+    # disconnected and resumes from its last event
+    ITEM_EVENTS_QUEUE_SIZE: int = 100
+    # Events replayed on resume, past that the client is told to reload
+    ITEM_EVENTS_REPLAY_LIMIT: int = 1000
+    # Event ids are taken in insert order but the events are sent in commit
+    # order, so the replay also covers the events created this long before the
+    # client's last one. Longer than any transaction writing items
+    ITEM_EVENTS_REPLAY_OVERLAP_SECONDS: float = 10.0
+    ITEM_EVENTS_KEEPALIVE_SECONDS: float = 15.0
+    # Identical concurrent GET /items/ and /users/ in a worker share one execution
+    SINGLE_FLIGHT_ENABLED: bool = False
+    # Responses to requests with an Idempotency-Key are replayed this long
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 60 * 60 * 24
     POSTGRES_SERVER: str
     POSTGRES_PORT: int = 5432
     POSTGRES_USER: str
@@ -1,12 +1,44 @@
-from sqlmodel import Session, create_engine, select
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, with_loader_criteria
+from sqlmodel import Session, col, create_engine, select
 
 from app import crud
 from app.core.config import settings
-from app.models import User, UserCreate
+from app.models import Item, User, UserCreate
 
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 
 
+@event.listens_for(Session, "do_orm_execute")
+def _exclude_deleted(execute_state: ORMExecuteState) -> None:
+    """
+    Leave soft deleted users and items, and the items of deleted users, out of
+    every ORM query, unless it's run with `execution_options(include_deleted=True)`.
+    """
+    if (
+        not execute_state.is_select
+        or execute_state.is_column_load
+        or execute_state.is_relationship_load
+        or execute_state.execution_options.get("include_deleted", False)
+    ):
+        return
+    # The table rather than the entity, the criteria on User would apply to it.
+    # A hashed subplan over ix_user_id_deleted, as small as the deleted users
+    # app/purge.py hasn't removed yet
+    user_table = User.__table__  # type: ignore[attr-defined]
+    deleted_users = select(user_table.c.id).where(user_table.c.deleted_at.is_not(None))
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(
+            User, col(User.deleted_at).is_(None), include_aliases=True
+        ),
+        with_loader_criteria(
+            Item,
+            col(Item.deleted_at).is_(None) & col(Item.owner_id).not_in(deleted_users),
+            include_aliases=True,
+        ),
+    )
+
+
 # make sure all SQLModel models are imported (app.models) before initializing DB
 # otherwise, SQLModel might fail to initialize relationships properly
 # for more details: https://github.com/fastapi/full-stack-fastapi-template/issues/28
@@ -21,9 +53,7 @@ def init_db(session: Session) -> None:
     # This works because the models are already imported and registered from app.models
     # SQLModel.metadata.create_all(engine)
 
-    user = session.exec(
-        select(User).where(User.email == settings.FIRST_SUPERUSER)
-    ).first()
+    user = crud.get_user_by_email(session=session, email=settings.FIRST_SUPERUSER)
     if not user:
         user_in = UserCreate(
             email=settings.FIRST_SUPERUSER,
@@ -0,0 +1,69 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import Engine, text
+from sqlalchemy.pool import QueuePool
+
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+from app.models import HealthStatus
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_cached: tuple[float, HealthStatus] | None = None
+
+
+def _pool_usage(engine: Engine) -> float:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return 0.0
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    return pool.checkedout() / capacity if capacity else 0.0
+
+
+def _probe(engine: Engine) -> HealthStatus:
+    pool_usage = _pool_usage(engine)
+    if pool_usage >= settings.READINESS_MAX_POOL_USAGE:
+        # Don't queue for a connection behind the requests we're already late on
+        return HealthStatus(
+            ready=False, pool_usage=pool_usage, detail="Database pool saturated"
+        )
+    start = time.perf_counter()
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.warning(f"Readiness probe failed: {e}")
+        return HealthStatus(
+            ready=False, pool_usage=pool_usage, detail="Database unavailable"
+        )
+    latency_ms = (time.perf_counter() - start) * 1000
+    if latency_ms > settings.READINESS_MAX_DB_LATENCY_MS:
+        return HealthStatus(
+            ready=False,
+            database_latency_ms=latency_ms,
+            pool_usage=pool_usage,
+            detail="Database too slow",
+        )
+    return HealthStatus(
+        ready=True, database_latency_ms=latency_ms, pool_usage=pool_usage
+    )
+
+
+def check_readiness(engine: Engine) -> HealthStatus:
+    """
+    Probe the database, reusing the last result for
+    `settings.READINESS_CACHE_SECONDS` so frequent probes can't add load.
+    """
+    global _cached
+    with _lock:
+        now = time.monotonic()
+        if _cached and now - _cached[0] < settings.READINESS_CACHE_SECONDS:
+            CACHE_REQUESTS.inc("readiness", "hit")
+            return _cached[1]
+        CACHE_REQUESTS.inc("readiness", "miss")
+        status = _probe(engine)
+        _cached = (time.monotonic(), status)
+        return status
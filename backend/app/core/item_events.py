@@ -0,0 +1,183 @@
+"""
+Fan out item changes from Postgres to the SSE streams of this worker.
+
+The `item_event` trigger records every change to an item and NOTIFYs it on
+`ITEM_EVENTS_CHANNEL`. Each worker LISTENs on a single connection, whatever the
+number of open streams, and puts every event on the queues of the streams that
+can see it.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections.abc import AsyncIterator
+
+import psycopg
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.metrics import ITEM_EVENT_SUBSCRIBERS, ITEM_EVENT_SUBSCRIBERS_DROPPED
+from app.models import ITEM_EVENTS_CHANNEL, ItemEventPublic
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_SECONDS = 1.0
+# How long a new stream waits for the listener to connect
+LISTEN_TIMEOUT_SECONDS = 10.0
+# Probes of an idle listener connection before it's considered dead
+LISTEN_KEEPALIVE_INTERVAL_SECONDS = 5
+LISTEN_KEEPALIVE_COUNT = 3
+
+
+class Subscription:
+    def __init__(self, owner_id: uuid.UUID | None) -> None:
+        # None for every item, for superusers
+        self.owner_id = owner_id
+        # None is put on the queue when the stream has to end
+        self.queue: asyncio.Queue[ItemEventPublic | None] = asyncio.Queue(
+            settings.ITEM_EVENTS_QUEUE_SIZE + 1
+        )
+
+    def wants(self, event: ItemEventPublic) -> bool:
+        return self.owner_id is None or self.owner_id == event.owner_id
+
+    def close(self) -> None:
+        # Make room for the end of the stream, the client resumes from the last
+        # event it got
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class ItemEventBroker:
+    def __init__(self, conninfo: str) -> None:
+        self.conninfo = conninfo
+        self.subscriptions: set[Subscription] = set()
+        self._task: asyncio.Task[None] | None = None
+        self._listening = asyncio.Event()
+
+    async def subscribe(self, owner_id: uuid.UUID | None) -> Subscription:
+        """
+        Subscribe to the events of `owner_id`'s items, once the worker listens
+        for them, so no event committed after this returns is missed.
+
+        Raises `asyncio.TimeoutError` if the listener can't connect.
+        """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._listening = asyncio.Event()
+            self._task = loop.create_task(self._listen())
+        subscription = Subscription(owner_id)
+        self.subscriptions.add(subscription)
+        ITEM_EVENT_SUBSCRIBERS.inc()
+        try:
+            await asyncio.wait_for(self._listening.wait(), LISTEN_TIMEOUT_SECONDS)
+        except BaseException:
+            self.unsubscribe(subscription)
+            raise
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+            ITEM_EVENT_SUBSCRIBERS.dec()
+
+    def publish(self, event: ItemEventPublic) -> None:
+        for subscription in list(self.subscriptions):
+            if not subscription.wants(event):
+                continue
+            if subscription.queue.qsize() < settings.ITEM_EVENTS_QUEUE_SIZE:
+                subscription.queue.put_nowait(event)
+                continue
+            # A slow client doesn't hold up the others or grow the memory
+            logger.warning("Item event stream fell behind, disconnecting it")
+            ITEM_EVENT_SUBSCRIBERS_DROPPED.inc()
+            self.unsubscribe(subscription)
+            subscription.close()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                # No query runs on the connection once it listens, it's checked
+                # by TCP keepalives instead: the notifications that arrive
+                # during a query don't go through notifies()
+                connection = await psycopg.AsyncConnection.connect(
+                    self.conninfo,
+                    autocommit=True,
+                    keepalives=1,
+                    keepalives_idle=max(1, int(settings.ITEM_EVENTS_KEEPALIVE_SECONDS)),
+                    keepalives_interval=LISTEN_KEEPALIVE_INTERVAL_SECONDS,
+                    keepalives_count=LISTEN_KEEPALIVE_COUNT,
+                )
+                async with connection:
+                    await connection.execute(f"LISTEN {ITEM_EVENTS_CHANNEL}")
+                    self._listening.set()
+                    async for notify in connection.notifies():
+                        self.publish(
+                            ItemEventPublic.model_validate_json(notify.payload)
+                        )
+            except Exception as e:
+                logger.warning(f"Item event listener disconnected: {e}")
+            finally:
+                self._listening.clear()
+                # Events may have been missed, streams resume from the table
+                for subscription in list(self.subscriptions):
+                    self.unsubscribe(subscription)
+                    subscription.close()
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+def format_event(event: ItemEventPublic) -> str:
+    return f"id: {event.id}\ndata: {event.model_dump_json()}\n\n"
+
+
+async def stream(
+    subscription: Subscription,
+    replayed: list[ItemEventPublic],
+    reset_id: int | None = None,
+) -> AsyncIterator[str]:
+    """
+    Server-sent events for the subscription, after the `replayed` ones.
+
+    With `reset_id` the stream starts with a `reset` event instead, the client
+    missed too many events to replay and has to reload its items.
+    """
+    try:
+        if reset_id is not None:
+            yield f"id: {reset_id}\nevent: reset\ndata: {{}}\n\n"
+        for event in replayed:
+            yield format_event(event)
+        # Events committed while replaying were also queued
+        replayed_ids = {event.id for event in replayed}
+        while True:
+            try:
+                next_event = await asyncio.wait_for(
+                    subscription.queue.get(), settings.ITEM_EVENTS_KEEPALIVE_SECONDS
+                )
+            # Not the builtin TimeoutError before Python 3.11
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing the connection, and detects clients
+                # that went away
+                yield ": keepalive\n\n"
+                continue
+            if next_event is None:
+                return
+            if next_event.id not in replayed_ids:
+                yield format_event(next_event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+broker = ItemEventBroker(
+    engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+)
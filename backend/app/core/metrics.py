@@ -0,0 +1,416 @@
+"""
+Minimal Prometheus metrics.
+
+Each worker keeps its metrics in memory. When `settings.METRICS_MULTIPROC_DIR`
+is set, workers also write a snapshot to `<dir>/<pid>-<uuid>.json` at most
+every `settings.METRICS_FLUSH_SECONDS` and the worker that serves a scrape
+merges all the snapshots: counters and histograms are summed over every worker
+that ever wrote one, gauges only over workers that are still alive.
+
+The snapshots of workers that exited are folded into `<dir>/retired.json`, so
+the directory doesn't grow with every restart and a new worker reusing a pid
+doesn't take the place of the one that had it.
+"""
+
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Engine
+from sqlalchemy.pool import QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+Labels = tuple[str, ...]
+
+RETIRED = "retired.json"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    @abstractmethod
+    def collect(self) -> list[tuple[Labels, Any]]:
+        """
+        The value of each set of labels.
+        """
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def collect(self) -> list[tuple[Labels, Any]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[Labels, float] = {}
+        self._function: Callable[[], float] | None = None
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    @contextmanager
+    def track_inprogress(self, *labelvalues: str) -> Iterator[None]:
+        self.inc(*labelvalues)
+        try:
+            yield
+        finally:
+            self.dec(*labelvalues)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Compute the (unlabelled) value when collected instead of storing it.
+        """
+        self._function = function
+
+    def collect(self) -> list[tuple[Labels, Any]]:
+        if self._function is not None:
+            return [((), float(self._function()))]
+        with self._lock:
+            return list(self._values.items())
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self._values: dict[Labels, dict[str, Any]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            sample = self._values.get(labelvalues)
+            if sample is None:
+                sample = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[labelvalues] = sample
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample["buckets"][i] += 1
+                    break
+            sample["sum"] += value
+            sample["count"] += 1
+
+    def collect(self) -> list[tuple[Labels, Any]]:
+        with self._lock:
+            return [
+                (labels, {**sample, "buckets": list(sample["buckets"])})
+                for labels, sample in self._values.items()
+            ]
+
+
+REGISTRY: list[Metric] = []
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by route and status code.",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time until the last byte of the response was sent.",
+    ("method", "route"),
+)
+DB_POOL_SIZE = Gauge("db_pool_size", "Connections kept in the database pool.")
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Database connections currently in use."
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Database connections opened beyond the pool size."
+)
+PASSWORD_HASH_INPROGRESS = Gauge(
+    "password_hash_inprogress",
+    "Password hashes and verifications waiting for or running on a thread.",
+)
+EMAILS_SENT = Counter("emails_sent_total", "Emails sent by status.", ("status",))
+ITEM_EVENT_SUBSCRIBERS = Gauge(
+    "item_event_subscribers", "Item event streams open on this worker."
+)
+ITEM_EVENT_SUBSCRIBERS_DROPPED = Counter(
+    "item_event_subscribers_dropped_total",
+    "Item event streams disconnected for falling behind.",
+)
+SINGLE_FLIGHT_FAN_IN = Histogram(
+    "single_flight_fan_in",
+    "Requests served by each execution of a coalesced read.",
+    ("route",),
+    buckets=(1, 2, 5, 10, 25, 50, 100),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result.", ("cache", "result")
+)
+
+
+def instrument_engine(engine: Engine) -> None:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return
+    DB_POOL_SIZE.set_function(pool.size)
+    DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+    # overflow() starts at -pool_size while the pool is being filled
+    DB_POOL_OVERFLOW.set_function(lambda: max(pool.overflow(), 0))
+
+
+def snapshot() -> dict[str, Any]:
+    return {
+        metric.name: [[list(labels), value] for labels, value in metric.collect()]
+        for metric in REGISTRY
+    }
+
+
+_last_flush = 0.0
+
+
+_worker_id: tuple[int, str] | None = None
+
+
+def _snapshot_path(directory: Path) -> Path:
+    # The pid alone isn't unique over restarts, regenerated after a fork
+    global _worker_id
+    pid = os.getpid()
+    if _worker_id is None or _worker_id[0] != pid:
+        _worker_id = (pid, f"{pid}-{uuid.uuid4().hex}")
+    return directory / f"{_worker_id[1]}.json"
+
+
+def flush(*, force: bool = False) -> None:
+    """
+    Write this worker's snapshot for the other workers to aggregate.
+    """
+    global _last_flush
+    directory = settings.METRICS_MULTIPROC_DIR
+    now = time.monotonic()
+    if not directory or (
+        not force and now - _last_flush < settings.METRICS_FLUSH_SECONDS
+    ):
+        return
+    _last_flush = now
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    if _worker_id is None or _worker_id[0] != os.getpid():
+        # A previous worker with the same pid can't be alive anymore
+        _retire_dead_workers(path)
+    target = _snapshot_path(path)
+    tmp = path / f".{target.name}.tmp"
+    tmp.write_text(json.dumps({"pid": os.getpid(), "metrics": snapshot()}))
+    os.replace(tmp, target)
+
+
+def _is_alive(pid: int | None) -> bool:
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _retire_dead_workers(directory: Path) -> None:
+    """
+    Fold the snapshots of workers that exited into `retired.json`.
+
+    Their counters and histograms are kept, their gauges dropped. The lock
+    keeps two workers from folding the same snapshot twice.
+    """
+    with open(directory / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        own = _snapshot_path(directory)
+        retired = directory / RETIRED
+        dead = []
+        for path in directory.glob("*.json"):
+            if path in (own, retired):
+                continue
+            try:
+                worker = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            if worker["pid"] == os.getpid() or not _is_alive(worker["pid"]):
+                dead.append((path, worker))
+        if not dead:
+            return
+        snapshots = [worker for _, worker in dead]
+        if retired.exists():
+            snapshots.append(json.loads(retired.read_text()))
+        merged = _merge(snapshots)
+        metrics = {
+            name: [[list(labels), value] for labels, value in values.items()]
+            for name, values in merged.items()
+        }
+        tmp = directory / f".{RETIRED}.tmp"
+        tmp.write_text(json.dumps({"pid": None, "metrics": metrics}))
+        os.replace(tmp, retired)
+        for path, _ in dead:
+            path.unlink(missing_ok=True)
+
+
+def _load_snapshots() -> list[dict[str, Any]]:
+    directory = settings.METRICS_MULTIPROC_DIR
+    if not directory:
+        return [{"pid": os.getpid(), "metrics": snapshot()}]
+    flush(force=True)
+    _retire_dead_workers(Path(directory))
+    snapshots = []
+    for path in Path(directory).glob("*.json"):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            # Removed or replaced while reading, it'll be there next scrape
+            continue
+    return snapshots
+
+
+def _merge(snapshots: list[dict[str, Any]]) -> dict[str, dict[Labels, Any]]:
+    merged: dict[str, dict[Labels, Any]] = {metric.name: {} for metric in REGISTRY}
+    types = {metric.name: metric.type for metric in REGISTRY}
+    for worker in snapshots:
+        alive = _is_alive(worker["pid"])
+        for name, samples in worker["metrics"].items():
+            if name not in merged or (types[name] == "gauge" and not alive):
+                continue
+            values = merged[name]
+            for labels, value in samples:
+                key = tuple(labels)
+                current = values.get(key)
+                if types[name] != "histogram":
+                    values[key] = (current or 0.0) + value
+                elif current is None:
+                    values[key] = value
+                else:
+                    current["buckets"] = [
+                        a + b
+                        for a, b in zip(
+                            current["buckets"], value["buckets"], strict=False
+                        )
+                    ]
+                    current["sum"] += value["sum"]
+                    current["count"] += value["count"]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=False)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def render() -> str:
+    """
+    Aggregated metrics of all workers in the Prometheus text format.
+    """
+    merged = _merge(_load_snapshots())
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for labels, value in sorted(merged[metric.name].items()):
+            if not isinstance(metric, Histogram):
+                label_str = _format_labels(metric.labelnames, labels)
+                lines.append(f"{metric.name}{label_str} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets, value["buckets"], strict=False):
+                cumulative += count
+                label_str = _format_labels(
+                    metric.labelnames, labels, f'le="{_format_value(bound)}"'
+                )
+                lines.append(f"{metric.name}_bucket{label_str} {cumulative}")
+            label_str = _format_labels(metric.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{metric.name}_bucket{label_str} {value['count']}")
+            label_str = _format_labels(metric.labelnames, labels)
+            lines.append(f"{metric.name}_sum{label_str} {_format_value(value['sum'])}")
+            lines.append(f"{metric.name}_count{label_str} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Count requests and observe their latency by route template.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            # Unmatched paths are grouped to keep the label cardinality bounded
+            route_path = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.inc(scope["method"], route_path, str(status_code))
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start, scope["method"], route_path
+            )
+            flush()
@@ -0,0 +1,172 @@
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import CodeType, FrameType
+
+import jwt
+from jwt.exceptions import InvalidTokenError
+
+from app.core import security
+from app.core.config import settings
+
+
+class Sampler:
+    """
+    Sample the Python stacks of the worker's threads on a background thread.
+
+    Sampling all threads (`thread_ids=None`) profiles the whole worker, a set
+    restricts the samples to the threads in it, see `follow_current_thread`.
+    """
+
+    def __init__(self, interval: float, thread_ids: set[int] | None = None) -> None:
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                self.stacks[_collapse(frame)] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def _frame_name(code: CodeType) -> str:
+    filename = code.co_filename.rsplit("site-packages/", 1)[-1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(frame: FrameType | None) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def render_collapsed(stacks: Counter[str]) -> str:
+    """
+    Stacks in the collapsed format read by flamegraph.pl, speedscope, etc.
+    """
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+_profile_lock = threading.Lock()
+
+
+def profile_worker(seconds: float, interval: float) -> str | None:
+    """
+    Profile every thread of this worker for `seconds`, or return None if a
+    profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        sampler = Sampler(interval)
+        sampler.start()
+        time.sleep(seconds)
+        return render_collapsed(sampler.stop())
+    finally:
+        _profile_lock.release()
+
+
+_request_sampler: ContextVar[Sampler | None] = ContextVar(
+    "request_sampler", default=None
+)
+
+
+@contextmanager
+def profile_request(interval: float) -> Iterator[Sampler]:
+    sampler = Sampler(interval, thread_ids=set())
+    token = _request_sampler.set(sampler)
+    sampler.start()
+    try:
+        yield sampler
+    finally:
+        sampler.stop()
+        _request_sampler.reset(token)
+
+
+@contextmanager
+def follow_current_thread() -> Iterator[None]:
+    """
+    Sample the current thread while in the block if the request is profiled.
+    """
+    sampler = _request_sampler.get()
+    if sampler is None or sampler.thread_ids is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    sampler.thread_ids.add(thread_id)
+    try:
+        yield
+    finally:
+        sampler.thread_ids.discard(thread_id)
+
+
+# Signed with a different key so profiling tokens can't be used as access tokens
+def _token_key() -> str:
+    return f"{settings.SECRET_KEY}:profiling"
+
+
+def create_profiling_token(expires_delta: timedelta) -> str:
+    expire = datetime.now(timezone.utc) + expires_delta
+    return jwt.encode(
+        {"exp": expire, "sub": "profiling"}, _token_key(), algorithm=security.ALGORITHM
+    )
+
+
+def verify_profiling_token(token: str) -> bool:
+    try:
+        jwt.decode(token, _token_key(), algorithms=[security.ALGORITHM])
+    except InvalidTokenError:
+        return False
+    return True
+
+
+def save_trace(trace_id: uuid.UUID, stacks: Counter[str]) -> None:
+    # Traces go to disk so any worker of the instance can serve them
+    directory = Path(settings.PROFILING_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f"{trace_id}.folded").write_text(render_collapsed(stacks))
+    _remove_old_traces(directory)
+
+
+def _remove_old_traces(directory: Path) -> None:
+    traces = []
+    for path in directory.glob("*.folded"):
+        try:
+            traces.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            # Removed by another worker
+            continue
+    traces.sort(reverse=True)
+    for _, path in traces[settings.PROFILING_MAX_TRACES :]:
+        path.unlink(missing_ok=True)
+
+
+def load_trace(trace_id: uuid.UUID) -> str | None:
+    path = Path(settings.PROFILING_DIR) / f"{trace_id}.folded"
+    if not path.exists():
+        return None
+    return path.read_text()
@@ -0,0 +1,108 @@
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import Engine, event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def is_savepoint(statement: str) -> bool:
+    """
+    Transaction control isn't a query, BEGIN and COMMIT don't even reach the
+    cursor hooks, but SAVEPOINT, RELEASE and ROLLBACK TO SAVEPOINT do.
+    """
+    return statement.upper().startswith(
+        ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+    )
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    statements: Counter[str] = field(default_factory=Counter)
+
+    def record(self, statement: str) -> None:
+        if is_savepoint(statement):
+            return
+        self.count += 1
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        """
+        Statements executed at least `threshold` times, the usual sign of an
+        N+1 pattern like lazy loading a relationship inside a loop.
+        """
+        return {
+            statement: count
+            for statement, count in self.statements.items()
+            if count >= threshold
+        }
+
+    def report(self) -> str:
+        return "\n".join(
+            f"{count}x {statement}"
+            for statement, count in self.statements.most_common()
+        )
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def _after_cursor_execute(
+    _conn: Any,
+    _cursor: Any,
+    statement: str,
+    _parameters: Any,
+    _context: Any,
+    _executemany: bool,
+) -> None:
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.record(statement)
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryCountMiddleware:
+    """
+    Count the SQL statements of each request in an `X-Query-Count` header and
+    log a warning when a statement repeats enough to look like an N+1.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+
+        async def send_with_count(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Query-Count", str(stats.count))
+            await send(message)
+
+        token = _query_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _query_stats.reset(token)
+            repeated = stats.repeated(settings.QUERY_REPEAT_THRESHOLD)
+            if repeated:
+                route = scope.get("route")
+                logger.warning(
+                    f"Possible N+1 queries in {scope['method']} "
+                    f"{getattr(route, 'path', scope['path'])}: {repeated}"
+                )
@@ -0,0 +1,150 @@
+import json
+import logging
+import socket
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import Engine, text
+from tenacity import (
+    Retrying,
+    before_sleep_log,
+    stop_after_attempt,
+    stop_after_delay,
+    wait_random_exponential,
+)
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_DIR = Path(__file__).parents[1] / "alembic"
+
+# Give up on a required check after this long
+MAX_WAIT_SECONDS = 60 * 5
+# The first retry comes quickly, services are often only a moment away
+INITIAL_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 5
+SMTP_TIMEOUT_SECONDS = 5
+
+
+@dataclass
+class Check:
+    name: str
+    probe: Callable[[], None]
+    # A failing optional check is only logged, it's tried once
+    required: bool = True
+
+
+@dataclass
+class CheckResult:
+    name: str
+    ready: bool
+    attempts: int
+    seconds: float
+
+
+def database_check(engine: Engine) -> Check:
+    def probe() -> None:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    return Check("database", probe)
+
+
+def migrations_check(engine: Engine) -> Check:
+    def probe() -> None:
+        config = Config()
+        config.set_main_option("script_location", str(ALEMBIC_DIR))
+        heads = set(ScriptDirectory.from_config(config).get_heads())
+        with engine.connect() as connection:
+            current = set(MigrationContext.configure(connection).get_current_heads())
+        if current != heads:
+            raise RuntimeError(
+                f"Database is at revision {sorted(current)}, expected {sorted(heads)}"
+            )
+
+    return Check("migrations", probe)
+
+
+def smtp_check() -> Check:
+    def probe() -> None:
+        assert settings.SMTP_HOST
+        with socket.create_connection(
+            (settings.SMTP_HOST, settings.SMTP_PORT), timeout=SMTP_TIMEOUT_SECONDS
+        ):
+            pass
+
+    return Check("smtp", probe, required=False)
+
+
+def _run(check: Check, start: float, max_wait_seconds: float) -> CheckResult:
+    retrying = Retrying(
+        stop=stop_after_delay(max_wait_seconds)
+        if check.required
+        else stop_after_attempt(1),
+        # Full jitter, workers started together don't retry in lockstep
+        wait=wait_random_exponential(
+            multiplier=INITIAL_BACKOFF_SECONDS, max=MAX_BACKOFF_SECONDS
+        ),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+        reraise=True,
+    )
+    try:
+        retrying(check.probe)
+    except Exception as e:
+        if check.required:
+            raise
+        logger.warning(f"{check.name} is not reachable: {e}")
+        ready = False
+    else:
+        ready = True
+    return CheckResult(
+        name=check.name,
+        ready=ready,
+        attempts=retrying.statistics["attempt_number"],
+        seconds=time.perf_counter() - start,
+    )
+
+
+def wait_until_ready(
+    checks: list[Check], max_wait_seconds: float | None = None
+) -> list[CheckResult]:
+    """
+    Run the checks in parallel, retrying each with jittered exponential backoff
+    until it passes, and log when each one became ready.
+
+    Raises the last error of a required check that still fails after
+    `max_wait_seconds`, `MAX_WAIT_SECONDS` by default.
+    """
+    if max_wait_seconds is None:
+        max_wait_seconds = MAX_WAIT_SECONDS
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = [
+            executor.submit(_run, check, start, max_wait_seconds) for check in checks
+        ]
+        results = [future.result() for future in futures]
+    logger.info(
+        json.dumps(
+            {
+                "event": "startup_timeline",
+                "total_seconds": round(time.perf_counter() - start, 3),
+                "checks": [
+                    {
+                        "name": result.name,
+                        "ready": result.ready,
+                        "attempts": result.attempts,
+                        "seconds": round(result.seconds, 3),
+                    }
+                    for result in results
+                ],
+            }
+        )
+    )
+    return results
@@ -5,6 +5,7 @@ import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.metrics import PASSWORD_HASH_INPROGRESS
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -20,8 +21,10 @@ def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with PASSWORD_HASH_INPROGRESS.track_inprogress():
+        return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    with PASSWORD_HASH_INPROGRESS.track_inprogress():
+        return pwd_context.hash(password)
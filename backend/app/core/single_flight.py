@@ -0,0 +1,83 @@
+"""
+Serve identical concurrent reads with a single execution.
+
+When `settings.SINGLE_FLIGHT_ENABLED` is set, a request that arrives while an
+identical one (same route, parameters and user scope) is running in the same
+worker waits for it and gets its result, instead of running the queries again.
+Only requests already in flight are coalesced, nothing is cached after the
+leader returns.
+"""
+
+import threading
+from collections.abc import Callable, Hashable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import SINGLE_FLIGHT_FAN_IN
+
+T = TypeVar("T")
+
+_disabled: ContextVar[bool] = ContextVar("single_flight_disabled", default=False)
+
+
+@contextmanager
+def disabled() -> Iterator[None]:
+    """
+    Run the reads of the block on their own, for requests that must see their
+    own uncommitted changes.
+    """
+    token = _disabled.set(True)
+    try:
+        yield
+    finally:
+        _disabled.reset(token)
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.requests = 1
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, function: Callable[[], T]) -> T:
+        """
+        Call `function`, or wait for the call already running for `key` and
+        return its result, or raise its error.
+        """
+        if not settings.SINGLE_FLIGHT_ENABLED or _disabled.get():
+            return function()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+            else:
+                call.requests += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            shared: T = call.result
+            return shared
+        try:
+            result = call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Requests from now on run the function again
+            with self._lock:
+                del self._calls[key]
+            SINGLE_FLIGHT_FAN_IN.observe(call.requests, self.name)
+            call.done.set()
+        return result
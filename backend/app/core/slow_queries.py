@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+# Distinct statements kept for the top-N, the least expensive are dropped
+MAX_TRACKED_STATEMENTS = 500
+# Plans waiting to be captured, slow queries beyond this are logged without one
+MAX_PENDING_EXPLAINS = 10
+
+_current_scope: ContextVar[Scope | None] = ContextVar("slow_query_scope", default=None)
+_lock = threading.Lock()
+_queries: dict[str, SlowQuery] = {}
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+_pending_explains = threading.BoundedSemaphore(MAX_PENDING_EXPLAINS)
+
+
+def _current_route() -> str | None:
+    scope = _current_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+
+def _parameter_shape(parameters: Any) -> dict[str, str]:
+    """
+    Types of the bound parameters, the values may be sensitive.
+    """
+    if isinstance(parameters, Sequence) and not isinstance(parameters, str):
+        if parameters and isinstance(parameters[0], Mapping | list | tuple):
+            # executemany, the rows share their shape
+            return _parameter_shape(parameters[0])
+        return {str(i): type(value).__name__ for i, value in enumerate(parameters)}
+    if isinstance(parameters, Mapping):
+        return {str(name): type(value).__name__ for name, value in parameters.items()}
+    return {}
+
+
+def _explain(engine: Engine, statement: str, parameters: Any) -> None:
+    try:
+        explain = "EXPLAIN "
+        if (
+            settings.SLOW_QUERY_EXPLAIN_ANALYZE
+            and statement.lstrip().upper().startswith("SELECT")
+        ):
+            explain += "(ANALYZE, BUFFERS) "
+        # A raw connection runs the exact DBAPI statement and skips these hooks
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(explain + statement, parameters)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            # Never keep what an analyzed statement may have done
+            connection.rollback()
+            connection.close()
+        with _lock:
+            if statement in _queries:
+                _queries[statement].plan = plan
+        logger.info(json.dumps({"event": "slow_query_plan", "plan": plan}))
+    except Exception as e:
+        logger.warning(f"Could not capture slow query plan: {e}")
+    finally:
+        _pending_explains.release()
+
+
+def _record(
+    engine: Engine, statement: str, parameters: Any, duration_ms: float
+) -> None:
+    route = _current_route()
+    shape = _parameter_shape(parameters)
+    with _lock:
+        query = _queries.get(statement)
+        if query is None:
+            if len(_queries) >= MAX_TRACKED_STATEMENTS:
+                cheapest = min(_queries.values(), key=lambda q: q.total_ms)
+                del _queries[cheapest.statement]
+            query = SlowQuery(statement=statement, parameters=shape)
+            _queries[statement] = query
+        query.count += 1
+        query.total_ms += duration_ms
+        query.max_ms = max(query.max_ms, duration_ms)
+        query.route = route
+        needs_plan = query.plan is None
+    logger.warning(
+        json.dumps(
+            {
+                "event": "slow_query",
+                "duration_ms": round(duration_ms, 2),
+                "route": route,
+                "statement": statement,
+                "parameters": shape,
+            }
+        )
+    )
+    if needs_plan and _pending_explains.acquire(blocking=False):
+        _explain_executor.submit(_explain, engine, statement, parameters)
+
+
+def top_slow_queries(limit: int) -> list[SlowQuery]:
+    with _lock:
+        queries = sorted(_queries.values(), key=lambda q: q.total_ms, reverse=True)
+        return [query.model_copy() for query in queries[:limit]]
+
+
+def _before_cursor_execute(
+    _conn: Any,
+    _cursor: Any,
+    _statement: str,
+    _parameters: Any,
+    context: Any,
+    _executemany: bool,
+) -> None:
+    context._slow_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(
+    conn: Any,
+    _cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    start = getattr(context, "_slow_query_start", None)
+    if start is None:
+        return
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms < settings.SLOW_QUERY_THRESHOLD_MS:
+        return
+    if executemany and parameters:
+        # The plan of one row stands for all of them
+        parameters = parameters[0]
+    _record(conn.engine, statement, parameters, duration_ms)
+
+
+def instrument_engine(engine: Engine) -> None:
+    if settings.SLOW_QUERY_LOG_FILE:
+        # One file per worker, rotating a file shared by processes loses lines
+        path = Path(settings.SLOW_QUERY_LOG_FILE)
+        handler = RotatingFileHandler(
+            path.with_name(f"{path.stem}.{os.getpid()}{path.suffix}"),
+            maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUP_COUNT,
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SlowQueryMiddleware:
+    """
+    Make the route of the request available to the slow query log.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
@@ -0,0 +1,198 @@
+import asyncio
+import functools
+import json
+import logging
+import random
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi.routing import APIRoute
+from sqlalchemy import Engine, event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.profiling import follow_current_thread
+from app.core.query_stats import is_savepoint
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestTiming:
+    start: float = field(default_factory=time.perf_counter)
+    phases: dict[str, float] = field(default_factory=dict)
+    db_queries: int = 0
+    handler_end: float | None = None
+
+    def add(self, name: str, duration: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    def server_timing(self) -> str:
+        metrics = []
+        for name, duration in self.phases.items():
+            metric = f"{name};dur={duration * 1000:.2f}"
+            if name == "db":
+                metric += f';desc="{self.db_queries} queries"'
+            metrics.append(metric)
+        return ", ".join(metrics)
+
+
+_request_timing: ContextVar[RequestTiming | None] = ContextVar(
+    "request_timing", default=None
+)
+
+
+def get_request_timing() -> RequestTiming | None:
+    return _request_timing.get()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Attribute the time spent in the block to `name` on the sampled request.
+    """
+    timing = _request_timing.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+
+def _before_cursor_execute(
+    _conn: Any,
+    _cursor: Any,
+    _statement: str,
+    _parameters: Any,
+    context: Any,
+    _executemany: bool,
+) -> None:
+    if _request_timing.get() is not None:
+        context._timing_start = time.perf_counter()
+
+
+def _after_cursor_execute(
+    _conn: Any,
+    _cursor: Any,
+    statement: str,
+    _parameters: Any,
+    context: Any,
+    _executemany: bool,
+) -> None:
+    timing = _request_timing.get()
+    start = getattr(context, "_timing_start", None)
+    if timing is None or start is None or is_savepoint(statement):
+        return
+    timing.add("db", time.perf_counter() - start)
+    timing.db_queries += 1
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _timed_endpoint(call: Callable[..., Any]) -> Callable[..., Any]:
+    def mark_handler_end() -> None:
+        timing = _request_timing.get()
+        if timing is not None:
+            timing.handler_end = time.perf_counter()
+
+    if asyncio.iscoroutinefunction(call):
+
+        @functools.wraps(call)
+        async def async_endpoint(*args: Any, **kwargs: Any) -> Any:
+            with phase("handler"), follow_current_thread():
+                result = await call(*args, **kwargs)
+            mark_handler_end()
+            return result
+
+        return async_endpoint
+
+    @functools.wraps(call)
+    def endpoint(*args: Any, **kwargs: Any) -> Any:
+        with phase("handler"), follow_current_thread():
+            result = call(*args, **kwargs)
+        mark_handler_end()
+        return result
+
+    return endpoint
+
+
+class TimedRoute(APIRoute):
+    """
+    Route that records when the endpoint function returns, so the time between
+    that and the start of the response can be reported as serialization.
+
+    It also lets a profiled request sample the thread running the endpoint.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        super().__init__(path, endpoint, **kwargs)
+        # The request handler reads `dependant.call` on each request
+        self.dependant.call = _timed_endpoint(endpoint)
+
+
+class ServerTimingMiddleware:
+    """
+    Add a `Server-Timing` header and a structured log line to sampled requests.
+
+    The sampling rate is `settings.SERVER_TIMING_SAMPLE_RATE`, requests that
+    are not sampled only pay for the random draw.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or random.random() >= settings.SERVER_TIMING_SAMPLE_RATE
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                if timing.handler_end is not None:
+                    timing.add("serialize", now - timing.handler_end)
+                timing.add("total", now - timing.start)
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timing.server_timing())
+            await send(message)
+
+        token = _request_timing.set(timing)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timing.reset(token)
+            route = scope.get("route")
+            logger.info(
+                json.dumps(
+                    {
+                        "event": "request_timing",
+                        "method": scope["method"],
+                        "route": getattr(route, "path", scope["path"]),
+                        "status": status_code,
+                        "db_queries": timing.db_queries,
+                        **{
+                            f"{name}_ms": round(duration * 1000, 2)
+                            for name, duration in timing.phases.items()
+                        },
+                    }
+                )
+            )
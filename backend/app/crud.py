@@ -1,10 +1,19 @@
 import uuid
-from typing import Any
+from datetime import datetime, timedelta
 
-from sqlmodel import Session, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, func, or_, select
 
 from app.core.security import get_password_hash, verify_password
-from app.models import Item, ItemCreate, User, UserCreate, UserUpdate
+from app.models import (
+    IdempotencyKey,
+    Item,
+    ItemCreate,
+    ItemEvent,
+    User,
+    UserCreate,
+    UserUpdate,
+)
 
 
 def create_user(*, session: Session, user_create: UserCreate) -> User:
@@ -17,7 +26,42 @@ def create_user(*, session: Session, user_create: UserCreate) -> User:
     return db_obj
 
 
-def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
+def insert_user(*, session: Session, user_create: UserCreate) -> User | None:
+    """
+    Insert the user in one statement, or return None if a user with the email,
+    in any case, already exists, even if it's being created concurrently.
+
+    The user is only committed with the session.
+    """
+    values = User.model_validate(
+        user_create, update={"hashed_password": get_password_hash(user_create.password)}
+    ).model_dump()
+    statement = (
+        insert(User)
+        .values(**values)
+        .on_conflict_do_nothing(
+            index_elements=[func.lower(User.email)],
+            index_where=col(User.deleted_at).is_(None),
+        )
+        .returning(User)
+    )
+    return session.scalars(statement).first()
+
+
+def try_create_user(*, session: Session, user_create: UserCreate) -> User | None:
+    """
+    Create the user, or return None if a user with the email, in any case,
+    already exists, see `insert_user`.
+    """
+    db_obj = insert_user(session=session, user_create=user_create)
+    session.commit()
+    if db_obj is None:
+        return None
+    session.refresh(db_obj)
+    return db_obj
+
+
+def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> User:
     user_data = user_in.model_dump(exclude_unset=True)
     extra_data = {}
     if "password" in user_data:
@@ -32,7 +76,8 @@ def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
 
 
 def get_user_by_email(*, session: Session, email: str) -> User | None:
-    statement = select(User).where(User.email == email)
+    # Case insensitive, served by the unique index on lower(email)
+    statement = select(User).where(func.lower(User.email) == func.lower(email))
     session_user = session.exec(statement).first()
     return session_user
 
@@ -52,3 +97,69 @@ def create_item(*, session: Session, item_in: ItemCreate, owner_id: uuid.UUID) -
     session.commit()
     session.refresh(db_item)
     return db_item
+
+
+def get_item_events(
+    *,
+    session: Session,
+    owner_id: uuid.UUID | None,
+    after_id: int,
+    limit: int,
+    overlap: timedelta = timedelta(0),
+) -> list[ItemEvent]:
+    """
+    The events after `after_id`, and the ones created up to `overlap` before
+    it, which may have been committed after it, in id order.
+    """
+    after = col(ItemEvent.id) > after_id
+    after_event = session.get(ItemEvent, after_id) if overlap else None
+    if after_event:
+        after = or_(
+            after, col(ItemEvent.created_at) >= after_event.created_at - overlap
+        )
+    statement = select(ItemEvent).where(after)
+    if owner_id:
+        statement = statement.where(ItemEvent.owner_id == owner_id)
+    statement = statement.order_by(col(ItemEvent.id)).limit(limit)
+    return list(session.exec(statement).all())
+
+
+def get_last_item_event_id(*, session: Session, owner_id: uuid.UUID | None) -> int:
+    statement = select(func.max(col(ItemEvent.id)))
+    if owner_id:
+        statement = statement.where(ItemEvent.owner_id == owner_id)
+    return session.exec(statement).one() or 0
+
+
+def get_idempotency_key(
+    *, session: Session, scope: str, key: str, created_after: datetime
+) -> IdempotencyKey | None:
+    statement = select(IdempotencyKey).where(
+        IdempotencyKey.scope == scope,
+        IdempotencyKey.key == key,
+        col(IdempotencyKey.created_at) >= created_after,
+    )
+    return session.exec(statement).first()
+
+
+def try_save_idempotency_key(
+    *,
+    session: Session,
+    idempotency_key: IdempotencyKey,
+    expired_before: datetime,
+) -> bool:
+    """
+    Save the key in the session's transaction, replacing an expired one, or
+    return False if the key was saved by another request, even concurrently.
+    """
+    insert_key = insert(IdempotencyKey).values(**idempotency_key.model_dump())
+    statement = insert_key.on_conflict_do_update(
+        index_elements=[IdempotencyKey.scope, IdempotencyKey.key],
+        set_={
+            "request_hash": insert_key.excluded.request_hash,
+            "response": insert_key.excluded.response,
+            "created_at": insert_key.excluded.created_at,
+        },
+        where=col(IdempotencyKey.created_at) < expired_before,
+    ).returning(col(IdempotencyKey.key))
+    return session.scalars(statement).first() is not None
@@ -1,21 +1,41 @@
-import sentry_sdk
+import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
+from sqlalchemy.orm.exc import StaleDataError
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.api.preconditions import stale_data_handler
+from app.core import item_events, metrics, query_stats, slow_queries, timing
 from app.core.config import settings
+from app.core.db import engine
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
     return f"{route.tags[0]}-{route.name}"
 
 
+logging.basicConfig(level=logging.INFO)
+
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
+    # Only pay for importing the SDK when it's enabled
+    import sentry_sdk
+
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    yield
+    await item_events.broker.stop()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
@@ -30,4 +50,22 @@ if settings.all_cors_origins:
         allow_headers=["*"],
     )
 
+slow_queries.instrument_engine(engine)
+app.add_middleware(slow_queries.SlowQueryMiddleware)
+
+metrics.instrument_engine(engine)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Break down the time of sampled requests in a Server-Timing header
+timing.instrument_engine(engine)
+app.add_middleware(timing.ServerTimingMiddleware)
+
+# Expose per-request query counts outside of production
+if settings.ENVIRONMENT != "production":
+    query_stats.instrument_engine(engine)
+    app.add_middleware(query_stats.QueryCountMiddleware)
+
+# Updates that lost a race with another one, see app/api/preconditions.py
+app.add_exception_handler(StaleDataError, stale_data_handler)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -1,12 +1,30 @@
 import uuid
-
-from pydantic import EmailStr
+from datetime import datetime, timezone
+from typing import Annotated, Any, Literal
+
+from pydantic import AfterValidator, EmailStr
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    Column,
+    Computed,
+    DateTime,
+    Index,
+    event,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import declared_attr
 from sqlmodel import Field, Relationship, SQLModel
 
+# Emails are stored in lower case, and looked up case insensitively
+Email = Annotated[EmailStr, AfterValidator(str.lower)]
+
 
 # Shared properties
 class UserBase(SQLModel):
-    email: EmailStr = Field(unique=True, index=True, max_length=255)
+    email: Email = Field(unique=True, index=True, max_length=255)
     is_active: bool = True
     is_superuser: bool = False
     full_name: str | None = Field(default=None, max_length=255)
@@ -18,20 +36,20 @@ class UserCreate(UserBase):
 
 
 class UserRegister(SQLModel):
-    email: EmailStr = Field(max_length=255)
+    email: Email = Field(max_length=255)
     password: str = Field(min_length=8, max_length=128)
     full_name: str | None = Field(default=None, max_length=255)
 
 
 # Properties to receive via API on update, all are optional
 class UserUpdate(UserBase):
-    email: EmailStr | None = Field(default=None, max_length=255)  # type: ignore
+    email: Email | None = Field(default=None, max_length=255)  # type: ignore
     password: str | None = Field(default=None, min_length=8, max_length=128)
 
 
 class UserUpdateMe(SQLModel):
     full_name: str | None = Field(default=None, max_length=255)
-    email: EmailStr | None = Field(default=None, max_length=255)
+    email: Email | None = Field(default=None, max_length=255)
 
 
 class UpdatePassword(SQLModel):
@@ -41,14 +59,70 @@ class UpdatePassword(SQLModel):
 
 # Database model, database table inferred from class name
 class User(UserBase, table=True):
+    __table_args__ = (
+        # Emails are unique whatever their case, and a deleted user's email can
+        # be used again before the row is purged
+        Index(
+            "ix_user_lower_email_active",
+            func.lower(text("email")),
+            unique=True,
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_user_deleted_at",
+            "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL"),
+        ),
+        # An index only scan for the deleted owners every item query leaves out,
+        # see app/core/db.py
+        Index(
+            "ix_user_id_deleted",
+            "id",
+            postgresql_where=text("deleted_at IS NOT NULL"),
+        ),
+        # Trigram indexes for the fuzzy search of the user list, need pg_trgm
+        Index(
+            "ix_user_email_trgm",
+            "email",
+            postgresql_using="gin",
+            postgresql_ops={"email": "gin_trgm_ops"},
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "ix_user_full_name_trgm",
+            "full_name",
+            postgresql_using="gin",
+            postgresql_ops={"full_name": "gin_trgm_ops"},
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+    )
+
+    # Updates are UPDATE ... WHERE version = <the version loaded>, see
+    # app/api/preconditions.py
+    @declared_attr.directive
+    def __mapper_args__(cls) -> dict[str, Any]:
+        return {"version_id_col": cls.__table__.c.version}  # type: ignore[attr-defined]
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    email: EmailStr = Field(max_length=255)
     hashed_password: str
-    items: list["Item"] = Relationship(back_populates="owner", cascade_delete=True)
+    # Incremented by every update, the ETag of the user
+    version: int = Field(default=1, sa_column_kwargs={"server_default": text("1")})
+    # Set when the user is deleted, the row is removed later by app/purge.py
+    deleted_at: datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),  # type: ignore
+    )
+    # The foreign key cascades, the items aren't loaded to be deleted
+    items: list["Item"] = Relationship(
+        back_populates="owner", cascade_delete=True, passive_deletes=True
+    )
 
 
 # Properties to return via API, id is always required
 class UserPublic(UserBase):
     id: uuid.UUID
+    version: int
 
 
 class UsersPublic(SQLModel):
@@ -72,19 +146,86 @@ class ItemUpdate(ItemBase):
     title: str | None = Field(default=None, min_length=1, max_length=255)  # type: ignore
 
 
+# Text search configuration of Item.search_vector
+ITEM_SEARCH_CONFIG = "english"
+
+
 # Database model, database table inferred from class name
 class Item(ItemBase, table=True):
+    __table_args__ = (
+        Index(
+            "ix_item_deleted_at",
+            "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL"),
+        ),
+        Index("ix_item_search_vector", "search_vector", postgresql_using="gin"),
+        # Filters and sorts of the item list, see read_items. The owner ones also
+        # serve the foreign key
+        Index("ix_item_owner_id_created_at", "owner_id", "created_at"),
+        Index("ix_item_owner_id_updated_at", "owner_id", "updated_at"),
+        Index("ix_item_created_at", "created_at"),
+        Index("ix_item_updated_at", "updated_at"),
+        # The "C" collation lets the index serve prefix LIKEs as well as sorts
+        Index("ix_item_lower_title", text('lower(title) COLLATE "C"')),
+    )
+
+    # The search vector is only used in queries, it's never loaded with items.
+    # Updates are UPDATE ... WHERE version = <the version loaded>, see
+    # app/api/preconditions.py
+    @declared_attr.directive
+    def __mapper_args__(cls) -> dict[str, Any]:
+        return {
+            "exclude_properties": ["search_vector"],
+            "version_id_col": cls.__table__.c.version,  # type: ignore[attr-defined]
+        }
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     owner_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
     )
+    # The server defaults are for rows inserted outside of the ORM
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),  # type: ignore
+        sa_column_kwargs={"server_default": func.now()},
+    )
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),  # type: ignore
+        sa_column_kwargs={
+            "server_default": func.now(),
+            "onupdate": lambda: datetime.now(timezone.utc),
+        },
+    )
+    # Set when the item is deleted, the row is removed later by app/purge.py
+    deleted_at: datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),  # type: ignore
+    )
+    # Incremented by every update, the ETag of the item
+    version: int = Field(default=1, sa_column_kwargs={"server_default": text("1")})
     owner: User | None = Relationship(back_populates="items")
+    # Generated by Postgres from the title and description, see /items/search
+    search_vector: str | None = Field(
+        default=None,
+        sa_column=Column(
+            TSVECTOR,
+            Computed(
+                f"to_tsvector('{ITEM_SEARCH_CONFIG}', "
+                "coalesce(title, '') || ' ' || coalesce(description, ''))",
+                persisted=True,
+            ),
+        ),
+    )
 
 
 # Properties to return via API, id is always required
 class ItemPublic(ItemBase):
     id: uuid.UUID
     owner_id: uuid.UUID
+    created_at: datetime
+    updated_at: datetime
+    version: int
 
 
 class ItemsPublic(SQLModel):
@@ -92,11 +233,170 @@ class ItemsPublic(SQLModel):
     count: int
 
 
+# Most ids read by a single batch get
+ITEMS_BATCH_GET_MAX_IDS = 1000
+
+
+class ItemsBatchGet(SQLModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=ITEMS_BATCH_GET_MAX_IDS)
+
+
+class ItemsBatchPublic(SQLModel):
+    # In the order of the requested ids
+    data: list[ItemPublic]
+    # Requested ids that don't exist or that the user can't read
+    missing: list[uuid.UUID]
+
+
+class ItemsSearchPublic(SQLModel):
+    data: list[ItemPublic]
+    # Pass as `cursor` to get the next page, None on the last page
+    next_cursor: str | None = None
+
+
+# Change to an item, recorded by the item_event trigger on item
+class ItemEvent(SQLModel, table=True):
+    __tablename__ = "item_event"
+    __table_args__ = (
+        Index("ix_item_event_owner_id_id", "owner_id", "id"),
+        Index("ix_item_event_created_at", "created_at"),
+    )
+
+    # Also the SSE event id, streams resume after it
+    id: int | None = Field(default=None, primary_key=True, sa_type=BigInteger)
+    # No foreign keys, the events outlive purged items and users
+    item_id: uuid.UUID
+    owner_id: uuid.UUID
+    # created, updated or deleted
+    type: str = Field(max_length=16)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),  # type: ignore
+        sa_column_kwargs={"server_default": func.now()},
+    )
+
+
+class ItemEventPublic(SQLModel):
+    id: int
+    item_id: uuid.UUID
+    owner_id: uuid.UUID
+    type: str
+    created_at: datetime
+
+
+# Channel the item_event trigger NOTIFYs the new events on, as JSON
+ITEM_EVENTS_CHANNEL = "item_events"
+
+# Same as the migration, for databases created with SQLModel.metadata.create_all
+ITEM_EVENT_TRIGGER = DDL(  # type: ignore[no-untyped-call]
+    f"""
+CREATE OR REPLACE FUNCTION item_event_notify() RETURNS trigger AS $$
+DECLARE
+    event item_event;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO item_event (item_id, owner_id, type)
+        VALUES (NEW.id, NEW.owner_id, 'created') RETURNING * INTO event;
+    ELSIF OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL THEN
+        INSERT INTO item_event (item_id, owner_id, type)
+        VALUES (NEW.id, NEW.owner_id, 'deleted') RETURNING * INTO event;
+    ELSIF NEW.deleted_at IS NULL THEN
+        INSERT INTO item_event (item_id, owner_id, type)
+        VALUES (NEW.id, NEW.owner_id, 'updated') RETURNING * INTO event;
+    ELSE
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('{ITEM_EVENTS_CHANNEL}', row_to_json(event)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER item_event AFTER INSERT OR UPDATE ON item
+FOR EACH ROW EXECUTE FUNCTION item_event_notify();
+"""
+)
+event.listen(SQLModel.metadata, "after_create", ITEM_EVENT_TRIGGER)
+
+
+# Response to a request sent with an Idempotency-Key, replayed on retries
+class IdempotencyKey(SQLModel, table=True):
+    __tablename__ = "idempotency_key"
+    __table_args__ = (Index("ix_idempotency_key_created_at", "created_at"),)
+
+    # The endpoint, and the user for authenticated ones
+    scope: str = Field(primary_key=True, max_length=64)
+    key: str = Field(primary_key=True, max_length=255)
+    # HMAC of the request body, a key can't be reused for another request
+    request_hash: str = Field(max_length=64)
+    response: dict[str, Any] = Field(sa_column=Column(JSONB, nullable=False))
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),  # type: ignore
+        sa_column_kwargs={"server_default": func.now()},
+    )
+
+
+# Most sub-requests run by a single batch
+BATCH_MAX_REQUESTS = 20
+# Headers a sub-request can set, lower-cased, the others are refused
+BATCH_REQUEST_HEADERS = ("idempotency-key", "if-match")
+
+
+# Request to a route of the API, run as part of a batch
+class BatchRequest(SQLModel):
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"]
+    # Path under the API prefix, with the query string, like /items/?limit=10
+    path: str = Field(max_length=2048)
+    # Among BATCH_REQUEST_HEADERS, Authorization is the batch's
+    headers: dict[str, str] = Field(default_factory=dict)
+    # JSON body
+    body: Any = None
+
+
+class BatchRequests(SQLModel):
+    requests: list[BatchRequest] = Field(min_length=1, max_length=BATCH_MAX_REQUESTS)
+    # Keep the changes of all the requests or of none
+    atomic: bool = False
+
+
+class BatchResponse(SQLModel):
+    status: int
+    body: Any = None
+
+
+class BatchResponses(SQLModel):
+    responses: list[BatchResponse]
+
+
 # Generic message
 class Message(SQLModel):
     message: str
 
 
+# Result of the readiness probe
+class HealthStatus(SQLModel):
+    ready: bool
+    database_latency_ms: float | None = None
+    pool_usage: float
+    detail: str | None = None
+
+
+# Statement that ran over the slow query threshold, aggregated per worker
+class SlowQuery(SQLModel):
+    statement: str
+    parameters: dict[str, str]
+    route: str | None = None
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    plan: str | None = None
+
+
+class SlowQueriesPublic(SQLModel):
+    data: list[SlowQuery]
+    count: int
+
+
 # JSON payload containing access token
 class Token(SQLModel):
     access_token: str
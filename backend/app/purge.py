@@ -0,0 +1,173 @@
+"""
+Remove soft deleted users and items, old item events and expired idempotency
+keys from the database.
+
+Rows are deleted in batches of `PURGE_BATCH_SIZE`, each in its own short
+transaction followed by a pause, so the purge never holds locks long enough to
+block the API. Rows locked by a request are skipped and retried later.
+
+    python app/purge.py          # run forever, see the purge service
+    python app/purge.py --once   # purge what is there and exit
+"""
+
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import (
+    Connection,
+    Delete,
+    Engine,
+    delete,
+    exists,
+    func,
+    select,
+    tuple_,
+)
+from sqlmodel import col
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import IdempotencyKey, Item, ItemEvent, User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Only one purge runs at a time, whatever the number of replicas
+ADVISORY_LOCK_ID = 0x70757267
+
+
+def purge_statements(
+    cutoff: datetime,
+    batch_size: int,
+    events_cutoff: datetime,
+    idempotency_keys_cutoff: datetime,
+) -> dict[str, Delete]:
+    """
+    One batch of each step, in order: the items of deleted users, deleted
+    items, deleted users that no longer own items, item events older than
+    `events_cutoff`, then idempotency keys older than `idempotency_keys_cutoff`.
+    """
+    deleted_users = select(col(User.id)).where(col(User.deleted_at) < cutoff)
+    orphaned_items = (
+        select(col(Item.id))
+        .where(col(Item.owner_id).in_(deleted_users))
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    deleted_items = (
+        select(col(Item.id))
+        .where(col(Item.deleted_at) < cutoff)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    empty_users = (
+        select(col(User.id))
+        .where(
+            col(User.deleted_at) < cutoff,
+            ~exists().where(col(Item.owner_id) == User.id),
+        )
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    old_events = (
+        select(col(ItemEvent.id))
+        .where(col(ItemEvent.created_at) < events_cutoff)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    expired_keys = (
+        select(col(IdempotencyKey.scope), col(IdempotencyKey.key))
+        .where(col(IdempotencyKey.created_at) < idempotency_keys_cutoff)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return {
+        "items of deleted users": delete(Item).where(col(Item.id).in_(orphaned_items)),
+        "deleted items": delete(Item).where(col(Item.id).in_(deleted_items)),
+        "deleted users": delete(User).where(col(User.id).in_(empty_users)),
+        "item events": delete(ItemEvent).where(col(ItemEvent.id).in_(old_events)),
+        "idempotency keys": delete(IdempotencyKey).where(
+            tuple_(col(IdempotencyKey.scope), col(IdempotencyKey.key)).in_(expired_keys)
+        ),
+    }
+
+
+def _run_batch(connection: Connection, statement: Delete, lock_timeout: str) -> int:
+    with connection.begin():
+        # Give up on a batch rather than queue behind the API's writes
+        connection.execute(select(func.set_config("lock_timeout", lock_timeout, True)))
+        result = connection.execute(statement)
+    return result.rowcount
+
+
+def purge_once(
+    db_engine: Engine,
+    *,
+    batch_size: int | None = None,
+    pause_seconds: float | None = None,
+) -> int:
+    """
+    Purge the rows deleted more than `PURGE_RETENTION_SECONDS` ago, the item
+    events older than `ITEM_EVENTS_RETENTION_SECONDS` and the idempotency keys
+    older than `IDEMPOTENCY_KEY_TTL_SECONDS`, returns the number of rows
+    removed.
+    """
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    if pause_seconds is None:
+        pause_seconds = settings.PURGE_BATCH_PAUSE_SECONDS
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=settings.PURGE_RETENTION_SECONDS)
+    events_cutoff = now - timedelta(seconds=settings.ITEM_EVENTS_RETENTION_SECONDS)
+    idempotency_keys_cutoff = now - timedelta(
+        seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS
+    )
+    lock_timeout = f"{settings.PURGE_LOCK_TIMEOUT_MS}ms"
+    total = 0
+    with db_engine.connect() as connection:
+        statements = purge_statements(
+            cutoff, batch_size, events_cutoff, idempotency_keys_cutoff
+        )
+        for step, statement in statements.items():
+            while True:
+                try:
+                    purged = _run_batch(connection, statement, lock_timeout)
+                except Exception as e:
+                    logger.warning(f"Purge of {step} failed, will retry: {e}")
+                    break
+                total += purged
+                if purged:
+                    logger.info(f"Purged {purged} {step}")
+                if purged < batch_size:
+                    break
+                time.sleep(pause_seconds)
+    return total
+
+
+def run(db_engine: Engine) -> None:
+    with db_engine.connect() as lock_connection:
+        while not lock_connection.execute(
+            select(func.pg_try_advisory_lock(ADVISORY_LOCK_ID))
+        ).scalar():
+            lock_connection.commit()
+            time.sleep(settings.PURGE_INTERVAL_SECONDS)
+        lock_connection.commit()
+        logger.info("Purging deleted rows")
+        while True:
+            purge_once(db_engine)
+            time.sleep(settings.PURGE_INTERVAL_SECONDS)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args()
+    if args.once:
+        logger.info(f"Purged {purge_once(engine)} rows")
+    else:
+        run(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Fill the database with synthetic users and items at production volumes.
+
+    python app/seed_data.py --users 1000000 --items 10000000 --seed 42
+
+The same seed generates the same rows, use another seed to add more rows to a
+database that was already seeded. Every seeded user's password is `--password`.
+"""
+
+import argparse
+import itertools
+import logging
+import random
+import uuid
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+from sqlalchemy import Engine
+
+from app.core.db import engine
+from app.core.security import get_password_hash
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PASSWORD = "seeded-password"
+LOG_EVERY_ROWS = 100_000
+
+FIRST_NAMES = [
+    "Alice", "Bruno", "Chen", "Dara", "Elena", "Farid", "Grace", "Hiro", "Ines",
+    "Jonas", "Kofi", "Lina", "Mateo", "Nadia", "Omar", "Priya", "Quinn", "Rosa",
+    "Sven", "Tara", "Umar", "Vera", "Wei", "Ximena", "Yusuf", "Zoe",
+]  # fmt: skip
+LAST_NAMES = [
+    "Almeida", "Brown", "Costa", "Dubois", "Eriksen", "Fischer", "Garcia",
+    "Haddad", "Ivanova", "Jensen", "Kim", "Lopez", "Mensah", "Nguyen", "Okafor",
+    "Patel", "Rossi", "Silva", "Tanaka", "Walker", "Yilmaz", "Zhang",
+]  # fmt: skip
+DOMAINS = ["example.com", "example.org", "example.net", "mail.example.com"]
+ADJECTIVES = [
+    "Annual", "Blue", "Client", "Draft", "Final", "Internal", "Monthly", "New",
+    "Old", "Pending", "Quarterly", "Shared", "Team", "Urgent", "Weekly",
+]  # fmt: skip
+NOUNS = [
+    "budget", "checklist", "contract", "invoice", "meeting notes", "plan",
+    "proposal", "receipt", "report", "review", "roadmap", "schedule", "summary",
+]  # fmt: skip
+DISTRIBUTIONS = ["uniform", "zipf"]
+
+
+def _uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def generate_users(
+    rng: random.Random, count: int, seed: int, hashed_password: str
+) -> Iterator[tuple[Any, ...]]:
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        # The seed and index keep emails unique across seeds
+        email = f"{first}.{last}.{seed}.{i}@{rng.choice(DOMAINS)}".lower()
+        full_name = f"{first} {last}" if rng.random() < 0.9 else None
+        yield (_uuid(rng), email, full_name, hashed_password, True, False)
+
+
+def owner_picker(
+    rng: random.Random,
+    user_ids: list[uuid.UUID],
+    distribution: str,
+    zipf_exponent: float = 1.0,
+) -> Callable[[], uuid.UUID]:
+    """
+    Pick item owners uniformly, or with a zipf distribution where the k-th user
+    owns about 1/k^s as many items as the first, a few users own most items.
+    """
+    if distribution == "uniform":
+        return lambda: rng.choice(user_ids)
+    if distribution == "zipf":
+        cum_weights = list(
+            itertools.accumulate(
+                1 / rank**zipf_exponent for rank in range(1, len(user_ids) + 1)
+            )
+        )
+        return lambda: rng.choices(user_ids, cum_weights=cum_weights)[0]
+    raise ValueError(f"Unknown distribution {distribution}")
+
+
+def generate_items(
+    rng: random.Random, count: int, pick_owner: Callable[[], uuid.UUID]
+) -> Iterator[tuple[Any, ...]]:
+    for _ in range(count):
+        title = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+        description = (
+            f"{title} for {rng.choice(NOUNS)} {rng.randrange(1, 10_000)}"
+            if rng.random() < 0.7
+            else None
+        )
+        yield (_uuid(rng), title, description, pick_owner())
+
+
+def copy_rows(
+    cursor: Any, table: str, columns: list[str], rows: Iterable[tuple[Any, ...]]
+) -> int:
+    count = 0
+    with cursor.copy(f'COPY "{table}" ({", ".join(columns)}) FROM STDIN') as copy:
+        for row in rows:
+            copy.write_row(row)
+            count += 1
+            if count % LOG_EVERY_ROWS == 0:
+                logger.info(f"Copied {count} rows into {table}")
+    return count
+
+
+def seed_database(
+    db_engine: Engine,
+    *,
+    users: int,
+    items: int,
+    seed: int,
+    distribution: str = "uniform",
+    zipf_exponent: float = 1.0,
+    password: str = DEFAULT_PASSWORD,
+) -> list[uuid.UUID]:
+    """
+    COPY the users and items in one transaction and return the user ids.
+    """
+    rng = random.Random(seed)
+    # bcrypt is the slowest part of creating a user, hash once for all of them
+    hashed_password = get_password_hash(password)
+    user_rows = list(generate_users(rng, users, seed, hashed_password))
+    user_ids = [row[0] for row in user_rows]
+    pick_owner = owner_picker(rng, user_ids, distribution, zipf_exponent)
+
+    connection = db_engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        # Seeded items aren't changes anyone follows, don't record events
+        cursor.execute("ALTER TABLE item DISABLE TRIGGER item_event")
+        copy_rows(
+            cursor,
+            "user",
+            [
+                "id",
+                "email",
+                "full_name",
+                "hashed_password",
+                "is_active",
+                "is_superuser",
+            ],
+            user_rows,
+        )
+        copy_rows(
+            cursor,
+            "item",
+            ["id", "title", "description", "owner_id"],
+            generate_items(rng, items, pick_owner),
+        )
+        cursor.execute("ALTER TABLE item ENABLE TRIGGER item_event")
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return user_ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--zipf-exponent", type=float, default=1.0)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    args = parser.parse_args()
+
+    logger.info(f"Seeding {args.users} users and {args.items} items")
+    seed_database(
+        engine,
+        users=args.users,
+        items=args.items,
+        seed=args.seed,
+        distribution=args.distribution,
+        zipf_exponent=args.zipf_exponent,
+        password=args.password,
+    )
+    logger.info("Seed data created")
+
+
+if __name__ == "__main__":
+    main()
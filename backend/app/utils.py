@@ -1,18 +1,20 @@
 import logging
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-import emails  # type: ignore
 import jwt
-from jinja2 import Template
 from jwt.exceptions import InvalidTokenError
 
 from app.core import security
 from app.core.config import settings
+from app.core.metrics import EMAILS_SENT
+
+if TYPE_CHECKING:
+    from jinja2 import Template
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -22,11 +24,26 @@ class EmailData:
     subject: str
 
 
-def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
+# emails and jinja2 are imported on first use, most workers never send an email
+@lru_cache
+def _load_template(template_name: str) -> "Template":
+    from jinja2 import Template
+
     template_str = (
         Path(__file__).parent / "email-templates" / "build" / template_name
     ).read_text()
-    html_content = Template(template_str).render(context)
+    return Template(template_str)
+
+
+def escape_like(value: str) -> str:
+    """
+    Escape the LIKE wildcards in `value`, to match it literally.
+    """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
+    html_content = _load_template(template_name).render(context)
     return html_content
 
 
@@ -36,6 +53,8 @@ def send_email(
     subject: str = "",
     html_content: str = "",
 ) -> None:
+    import emails  # type: ignore
+
     assert settings.emails_enabled, "no provided configuration for email variables"
     message = emails.Message(
         subject=subject,
@@ -52,6 +71,7 @@ def send_email(
     if settings.SMTP_PASSWORD:
         smtp_options["password"] = settings.SMTP_PASSWORD
     response = message.send(to=email_to, smtp=smtp_options)
+    EMAILS_SENT.inc("success" if response.success else "failure")
     logger.info(f"send email result: {response}")
 
 
@@ -0,0 +1,6 @@
+#!/usr/bin/env bash
+
+set -e
+set -x
+
+BENCHMARK_ENABLED=true pytest tests/benchmarks "$@"
@@ -0,0 +1,7 @@
+#!/usr/bin/env bash
+
+set -e
+
+# Modules imported by app.main, slowest first (cumulative microseconds)
+python -X importtime -c "import app.main" 2> import-time.log
+sort -t'|' -k2 -n -r import-time.log | head -n "${1:-30}"
@@ -0,0 +1,300 @@
+"""
+Open-loop load generator for the API.
+
+Logs in real users through /login/access-token and replays a weighted mix of
+item calls at a fixed arrival rate, whatever the latency of the server, so
+overload shows up as growing latencies and errors instead of a lower rate.
+
+    python scripts/loadtest.py --rate 50 --duration 60 --users 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+
+OPERATIONS = (
+    "list_items",
+    "read_item",
+    "create_item",
+    "update_item",
+    "delete_item",
+    "read_me",
+)
+DEFAULT_MIX = "list_items=50,read_item=25,create_item=10,update_item=10,delete_item=5"
+
+
+@dataclass
+class VirtualUser:
+    email: str
+    headers: dict[str, str]
+    item_ids: list[str] = field(default_factory=list)
+
+
+@dataclass
+class OperationStats:
+    latencies: list[float] = field(default_factory=list)
+    statuses: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+    errors: int = 0
+
+    def summary(self, duration: float) -> dict[str, Any]:
+        total = len(self.latencies) + self.errors
+        failed = self.errors + sum(
+            count for status, count in self.statuses.items() if status >= 400
+        )
+        result: dict[str, Any] = {
+            "requests": total,
+            "throughput": total / duration,
+            "error_rate": failed / total if total else 0.0,
+            "statuses": dict(self.statuses),
+            "transport_errors": self.errors,
+        }
+        if len(self.latencies) >= 2:
+            ms = [latency * 1000 for latency in self.latencies]
+            cut_points = statistics.quantiles(ms, n=100, method="inclusive")
+            result.update(
+                p50_ms=cut_points[49], p95_ms=cut_points[94], p99_ms=cut_points[98]
+            )
+        return result
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.api = f"{args.base_url.rstrip('/')}/api/v1"
+        self.mix: dict[str, float] = args.mix
+        self.users: list[VirtualUser] = []
+        self.stats: dict[str, OperationStats] = defaultdict(OperationStats)
+        self.dropped = 0
+        self.client = httpx.AsyncClient(
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.max_in_flight),
+        )
+
+    async def login(self, email: str, password: str) -> dict[str, str]:
+        r = await self.client.post(
+            f"{self.api}/login/access-token",
+            data={"username": email, "password": password},
+        )
+        r.raise_for_status()
+        return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    async def setup(self) -> None:
+        admin = await self.login(
+            self.args.superuser_email, self.args.superuser_password
+        )
+        run_id = uuid.uuid4().hex[:8]
+
+        async def create_user(i: int) -> VirtualUser:
+            email = f"loadtest-{run_id}-{i}@example.com"
+            r = await self.client.post(
+                f"{self.api}/users/",
+                headers=admin,
+                json={"email": email, "password": self.args.password},
+            )
+            r.raise_for_status()
+            user = VirtualUser(
+                email=email, headers=await self.login(email, self.args.password)
+            )
+            for j in range(self.args.items_per_user):
+                r = await self.client.post(
+                    f"{self.api}/items/",
+                    headers=user.headers,
+                    json={"title": f"Item {j}", "description": "load test"},
+                )
+                r.raise_for_status()
+                user.item_ids.append(r.json()["id"])
+            return user
+
+        self.users = list(
+            await asyncio.gather(*(create_user(i) for i in range(self.args.users)))
+        )
+
+    async def teardown(self) -> None:
+        admin = await self.login(
+            self.args.superuser_email, self.args.superuser_password
+        )
+        for user in self.users:
+            r = await self.client.get(f"{self.api}/users/me", headers=user.headers)
+            if r.status_code == 200:
+                await self.client.delete(
+                    f"{self.api}/users/{r.json()['id']}", headers=admin
+                )
+        await self.client.aclose()
+
+    def build_request(
+        self, operation: str, user: VirtualUser
+    ) -> tuple[str, str, dict[str, Any]]:
+        title = f"Item {random.randrange(1_000_000)}"
+        if operation == "list_items":
+            params = {"skip": random.choice([0, 0, 0, 100]), "limit": 100}
+            return "GET", f"{self.api}/items/", {"params": params}
+        if operation == "create_item":
+            return "POST", f"{self.api}/items/", {"json": {"title": title}}
+        if operation == "read_me":
+            return "GET", f"{self.api}/users/me", {}
+        if not user.item_ids:
+            return "POST", f"{self.api}/items/", {"json": {"title": title}}
+        item_id = random.choice(user.item_ids)
+        if operation == "read_item":
+            return "GET", f"{self.api}/items/{item_id}", {}
+        if operation == "update_item":
+            return "PUT", f"{self.api}/items/{item_id}", {"json": {"title": title}}
+        if operation == "delete_item":
+            user.item_ids.remove(item_id)
+            return "DELETE", f"{self.api}/items/{item_id}", {}
+        raise ValueError(f"Unknown operation {operation}")
+
+    async def execute(self, operation: str, in_flight: asyncio.Semaphore) -> None:
+        user = random.choice(self.users)
+        stats = self.stats[operation]
+        start = time.perf_counter()
+        try:
+            method, url, kwargs = self.build_request(operation, user)
+            r = await self.client.request(method, url, headers=user.headers, **kwargs)
+        except httpx.HTTPError:
+            stats.errors += 1
+        else:
+            stats.latencies.append(time.perf_counter() - start)
+            stats.statuses[r.status_code] += 1
+            if operation == "create_item" and r.status_code == 200:
+                user.item_ids.append(r.json()["id"])
+        finally:
+            in_flight.release()
+
+    async def run(self) -> float:
+        operations = list(self.mix)
+        weights = list(self.mix.values())
+        in_flight = asyncio.Semaphore(self.args.max_in_flight)
+        tasks = set()
+        start = time.perf_counter()
+        next_arrival = start
+        while next_arrival - start < self.args.duration:
+            # Poisson arrivals, scheduled independently of response times
+            next_arrival += random.expovariate(self.args.rate)
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            if in_flight.locked():
+                self.dropped += 1
+                continue
+            await in_flight.acquire()
+            operation = random.choices(operations, weights)[0]
+            task = asyncio.create_task(self.execute(operation, in_flight))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    def report(self, duration: float) -> dict[str, Any]:
+        operations = {
+            name: stats.summary(duration) for name, stats in sorted(self.stats.items())
+        }
+        combined = OperationStats()
+        for stats in self.stats.values():
+            combined.latencies.extend(stats.latencies)
+            combined.errors += stats.errors
+            for status, count in stats.statuses.items():
+                combined.statuses[status] += count
+        return {
+            "config": {
+                "rate": self.args.rate,
+                "duration": self.args.duration,
+                "users": self.args.users,
+                "mix": self.mix,
+            },
+            "duration": duration,
+            "dropped": self.dropped,
+            "total": combined.summary(duration),
+            "operations": operations,
+        }
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for entry in mix.split(","):
+        name, _, weight = entry.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(
+                f"unknown operation {name!r}, choose from {', '.join(OPERATIONS)}"
+            )
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight {weight!r} for {name}")
+    return weights
+
+
+def format_report(report: dict[str, Any]) -> str:
+    lines = [
+        f"{'operation':<14}{'requests':>10}{'req/s':>10}{'errors':>9}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    ]
+    rows = {**report["operations"], "total": report["total"]}
+    for name, summary in rows.items():
+        lines.append(
+            f"{name:<14}{summary['requests']:>10}{summary['throughput']:>10.1f}"
+            f"{summary['error_rate']:>9.1%}{summary.get('p50_ms', 0):>10.1f}"
+            f"{summary.get('p95_ms', 0):>10.1f}{summary.get('p99_ms', 0):>10.1f}"
+        )
+    lines.append(f"dropped (max in flight reached): {report['dropped']}")
+    return "\n".join(lines) + "\n"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--rate", type=float, default=20, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--items-per-user", type=int, default=5)
+    parser.add_argument("--password", default="loadtest-password")
+    parser.add_argument(
+        "--mix", type=parse_mix, default=DEFAULT_MIX, help="operation=weight,..."
+    )
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument(
+        "--keep-users", action="store_true", help="Don't delete the load test users"
+    )
+    parser.add_argument(
+        "--superuser-email",
+        default=os.getenv("FIRST_SUPERUSER", "admin@example.com"),
+    )
+    parser.add_argument(
+        "--superuser-password",
+        default=os.getenv("FIRST_SUPERUSER_PASSWORD", "changethis"),
+    )
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    load_test = LoadTest(args)
+    await load_test.setup()
+    try:
+        duration = await load_test.run()
+    finally:
+        if args.keep_users:
+            await load_test.client.aclose()
+        else:
+            await load_test.teardown()
+    report = load_test.report(duration)
+    sys.stdout.write(format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
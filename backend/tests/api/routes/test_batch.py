@@ -0,0 +1,193 @@
+import uuid
+from collections.abc import Callable
+from contextlib import AbstractContextManager
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.query_stats import QueryStats
+from app.models import Item
+from tests.utils.item import create_random_item
+from tests.utils.utils import random_lower_string
+
+QueryBudget = Callable[[int], AbstractContextManager[QueryStats]]
+
+
+def test_batch(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    title = random_lower_string()
+    r = client.post(
+        f"{settings.API_V1_STR}/batch/",
+        headers=normal_user_token_headers,
+        json={
+            "requests": [
+                {"method": "POST", "path": "/items/", "body": {"title": title}},
+                {"method": "GET", "path": "/users/me"},
+                {"method": "GET", "path": f"/items/?title={title}"},
+                {"method": "GET", "path": f"/items/{uuid.uuid4()}"},
+            ]
+        },
+    )
+    assert r.status_code == 200
+    responses = r.json()["responses"]
+    assert [response["status"] for response in responses] == [200, 200, 200, 404]
+    created, me, items, missing = (response["body"] for response in responses)
+    assert created["title"] == title
+    assert me["email"] == settings.EMAIL_TEST_USER
+    assert created["owner_id"] == me["id"]
+    assert [item["id"] for item in items["data"]] == [created["id"]]
+    assert missing == {"detail": "Item not found"}
+    assert db.get(Item, uuid.UUID(created["id"]))
+
+
+def test_batch_atomic(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    title = random_lower_string()
+    r = client.post(
+        f"{settings.API_V1_STR}/batch/",
+        headers=superuser_token_headers,
+        json={
+            "atomic": True,
+            "requests": [
+                {"method": "POST", "path": "/items/", "body": {"title": title}},
+                {"method": "PUT", "path": f"/items/{item.id}", "body": {"title": ""}},
+                {"method": "DELETE", "path": f"/items/{item.id}"},
+            ],
+        },
+    )
+    assert r.status_code == 200
+    # Stopped at the invalid update, the item created before isn't kept
+    assert [response["status"] for response in r.json()["responses"]] == [200, 422]
+    assert db.exec(select(Item).where(Item.title == title)).first() is None
+    db.refresh(item)
+    assert item.deleted_at is None
+
+
+def test_batch_atomic_commits(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    r = client.post(
+        f"{settings.API_V1_STR}/batch/",
+        headers=superuser_token_headers,
+        json={
+            "atomic": True,
+            "requests": [
+                {"method": "PUT", "path": f"/items/{item.id}", "body": {"title": "A"}},
+                {"method": "PUT", "path": f"/items/{item.id}", "body": {"title": "B"}},
+            ],
+        },
+    )
+    assert r.status_code == 200
+    assert [response["status"] for response in r.json()["responses"]] == [200, 200]
+    db.refresh(item)
+    assert item.title == "B"
+
+
+def test_batch_not_allowed(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/batch/",
+        headers=superuser_token_headers,
+        json={
+            "requests": [
+                {"method": "POST", "path": "/batch/", "body": {"requests": []}},
+                {"method": "GET", "path": "/items/events"},
+                {"method": "GET", "path": "/not-a-route"},
+                {"method": "PATCH", "path": "/items/"},
+            ]
+        },
+    )
+    assert r.status_code == 200
+    assert [response["status"] for response in r.json()["responses"]] == [
+        400,
+        400,
+        404,
+        405,
+    ]
+
+
+def test_batch_not_authenticated(client: TestClient) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/batch/",
+        json={"requests": [{"method": "GET", "path": "/users/me"}]},
+    )
+    assert r.status_code == 401
+
+
+def test_batch_query_budget(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    query_budget: QueryBudget,
+) -> None:
+    # The user is loaded once for the whole batch
+    with query_budget(1):
+        r = client.post(
+            f"{settings.API_V1_STR}/batch/",
+            headers=normal_user_token_headers,
+            json={"requests": [{"method": "GET", "path": "/users/me"}] * 5},
+        )
+    assert r.status_code == 200
+    assert [response["status"] for response in r.json()["responses"]] == [200] * 5
+
+
+def test_batch_headers(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    db: Session,  # noqa: ARG001
+) -> None:
+    key = random_lower_string()
+    create = {
+        "method": "POST",
+        "path": "/items/",
+        "headers": {"Idempotency-Key": key},
+        "body": {"title": "Foo"},
+    }
+    r = client.post(
+        f"{settings.API_V1_STR}/batch/",
+        headers=normal_user_token_headers,
+        json={"requests": [create, create]},
+    )
+    assert r.status_code == 200
+    created, replayed = r.json()["responses"]
+    assert created["status"] == replayed["status"] == 200
+    assert replayed["body"]["id"] == created["body"]["id"]
+
+    item_path = f"/items/{created['body']['id']}"
+    r = client.post(
+        f"{settings.API_V1_STR}/batch/",
+        headers=normal_user_token_headers,
+        json={
+            "requests": [
+                {
+                    "method": "PUT",
+                    "path": item_path,
+                    "headers": {"If-Match": '"1"'},
+                    "body": {"title": "Bar"},
+                },
+                # Read before the first update
+                {
+                    "method": "PUT",
+                    "path": item_path,
+                    "headers": {"If-Match": '"1"'},
+                    "body": {"title": "Baz"},
+                },
+                {
+                    "method": "GET",
+                    "path": item_path,
+                    "headers": {"X-Forwarded-For": "127.0.0.1"},
+                },
+            ]
+        },
+    )
+    assert r.status_code == 200
+    assert [response["status"] for response in r.json()["responses"]] == [
+        200,
+        412,
+        400,
+    ]
@@ -1,10 +1,21 @@
+import asyncio
+import json
 import uuid
+from typing import Any
+from unittest.mock import AsyncMock, patch
 
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlalchemy import event
+from sqlmodel import Session, col, delete, select, update
 
+from app import crud
+from app.core import item_events
 from app.core.config import settings
+from app.core.db import engine
+from app.models import ITEMS_BATCH_GET_MAX_IDS, Item, ItemCreate, ItemEvent
 from tests.utils.item import create_random_item
+from tests.utils.user import create_random_user
+from tests.utils.utils import random_lower_string
 
 
 def test_create_item(
@@ -24,6 +35,48 @@ def test_create_item(
     assert "owner_id" in content
 
 
+def test_create_item_idempotency_key(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    data = {"title": random_lower_string()}
+    headers = {**superuser_token_headers, "Idempotency-Key": random_lower_string()}
+    r = client.post(f"{settings.API_V1_STR}/items/", headers=headers, json=data)
+    assert r.status_code == 200
+    assert "Idempotent-Replayed" not in r.headers
+    retry = client.post(f"{settings.API_V1_STR}/items/", headers=headers, json=data)
+    assert retry.status_code == 200
+    assert retry.json() == r.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    items = db.exec(select(Item).where(Item.title == data["title"])).all()
+    assert len(items) == 1
+
+    r = client.post(
+        f"{settings.API_V1_STR}/items/", headers=headers, json={"title": "Other"}
+    )
+    assert r.status_code == 422
+
+
+def test_create_item_idempotency_key_per_user(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+) -> None:
+    data = {"title": random_lower_string()}
+    key = random_lower_string()
+    first = client.post(
+        f"{settings.API_V1_STR}/items/",
+        headers={**superuser_token_headers, "Idempotency-Key": key},
+        json=data,
+    )
+    second = client.post(
+        f"{settings.API_V1_STR}/items/",
+        headers={**normal_user_token_headers, "Idempotency-Key": key},
+        json=data,
+    )
+    assert first.status_code == second.status_code == 200
+    assert first.json()["id"] != second.json()["id"]
+
+
 def test_read_item(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -79,6 +132,101 @@ def test_read_items(
     assert len(content["data"]) >= 2
 
 
+def test_read_items_filtered_and_sorted(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    prefix = random_lower_string()
+    owner = create_random_user(db)
+    items = [
+        crud.create_item(
+            session=db, item_in=ItemCreate(title=f"{prefix}{title}"), owner_id=owner.id
+        )
+        for title in ["b", "A", "c"]
+    ]
+    crud.create_item(session=db, item_in=ItemCreate(title=prefix), owner_id=owner.id)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={
+            "title": f"{prefix.upper()}_",
+            "owner_id": str(owner.id),
+            "created_after": items[0].created_at.isoformat(),
+            "sort": "-title",
+        },
+    )
+    assert response.status_code == 200
+    content = response.json()
+    # The _ is matched literally, not as a wildcard
+    assert content["count"] == 0
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={
+            "title": prefix.upper(),
+            "owner_id": str(owner.id),
+            "created_after": items[0].created_at.isoformat(),
+            "created_before": items[2].created_at.isoformat(),
+            "sort": "-title",
+        },
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["count"] == 2
+    assert [item["title"] for item in content["data"]] == [f"{prefix}b", f"{prefix}A"]
+
+
+def test_read_items_sorted_by_update(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    ids = []
+    for title in ["First", "Second"]:
+        response = client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            json={"title": title},
+        )
+        ids.append(response.json()["id"])
+    response = client.put(
+        f"{settings.API_V1_STR}/items/{ids[0]}",
+        headers=normal_user_token_headers,
+        json={"title": "First updated"},
+    )
+    assert response.json()["updated_at"] > response.json()["created_at"]
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        params={"sort": "-updated_at", "limit": 2},
+    )
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == ids
+
+
+def test_read_items_other_owner_not_enough_permissions(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    other = create_random_user(db)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        params={"owner_id": str(other.id)},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Not enough permissions"
+
+
+def test_read_items_invalid_sort(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"sort": "description"},
+    )
+    assert response.status_code == 422
+
+
 def test_update_item(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -97,6 +245,66 @@ def test_update_item(
     assert content["owner_id"] == str(item.owner_id)
 
 
+def test_update_item_if_match(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    url = f"{settings.API_V1_STR}/items/{item.id}"
+    etag = client.get(url, headers=superuser_token_headers).headers["ETag"]
+    assert etag == '"1"'
+    response = client.put(
+        url,
+        headers={**superuser_token_headers, "If-Match": etag},
+        json={"title": "Updated title"},
+    )
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert response.headers["ETag"] == '"2"'
+    # Both were read before the update
+    response = client.put(
+        url,
+        headers={**superuser_token_headers, "If-Match": etag},
+        json={"title": "Lost update"},
+    )
+    assert response.status_code == 412
+    response = client.delete(
+        url, headers={**superuser_token_headers, "If-Match": f"W/{etag}, {etag}"}
+    )
+    assert response.status_code == 412
+    db.refresh(item)
+    assert item.title == "Updated title"
+    assert item.deleted_at is None
+
+
+def test_update_item_concurrent_update(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+
+    def update_concurrently(session: Session, *_args: Any) -> None:
+        # Another request updates the item after this one loaded it
+        session.connection().execute(
+            update(Item)
+            .where(col(Item.id) == item.id)
+            .values(title="Concurrent title", version=Item.version + 1)
+        )
+
+    event.listen(Session, "before_flush", update_concurrently, once=True)
+    try:
+        response = client.put(
+            f"{settings.API_V1_STR}/items/{item.id}",
+            headers=superuser_token_headers,
+            json={"title": "Lost update"},
+        )
+    finally:
+        event.remove(Session, "before_flush", update_concurrently)
+    assert response.status_code == 409
+    title = item.title
+    # Rolled back with the request's SAVEPOINT, but not overwritten
+    db.refresh(item)
+    assert item.title == title
+
+
 def test_update_item_not_found(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -137,6 +345,18 @@ def test_delete_item(
     assert response.status_code == 200
     content = response.json()
     assert content["message"] == "Item deleted successfully"
+    response = client.get(
+        f"{settings.API_V1_STR}/items/{item.id}",
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 404
+    # Kept until it's purged
+    deleted_item = db.exec(
+        select(Item)
+        .where(Item.id == item.id)
+        .execution_options(include_deleted=True, populate_existing=True)
+    ).one()
+    assert deleted_item.deleted_at is not None
 
 
 def test_delete_item_not_found(
@@ -162,3 +382,296 @@ def test_delete_item_not_enough_permissions(
     assert response.status_code == 400
     content = response.json()
     assert content["detail"] == "Not enough permissions"
+
+
+def test_batch_get_items(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    first, second = create_random_item(db), create_random_item(db)
+    unknown = uuid.uuid4()
+    response = client.post(
+        f"{settings.API_V1_STR}/items/batch-get",
+        headers=superuser_token_headers,
+        json={"ids": [str(second.id), str(unknown), str(first.id), str(second.id)]},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert [item["id"] for item in content["data"]] == [str(second.id), str(first.id)]
+    assert content["missing"] == [str(unknown)]
+
+
+def test_batch_get_items_only_owned(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    user = crud.get_user_by_email(session=db, email=settings.EMAIL_TEST_USER)
+    assert user
+    own = crud.create_item(
+        session=db, item_in=ItemCreate(title="Foo"), owner_id=user.id
+    )
+    other = create_random_item(db)
+    response = client.post(
+        f"{settings.API_V1_STR}/items/batch-get",
+        headers=normal_user_token_headers,
+        json={"ids": [str(own.id), str(other.id)]},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert [item["id"] for item in content["data"]] == [str(own.id)]
+    assert content["missing"] == [str(other.id)]
+
+
+def test_batch_get_items_too_many_ids(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    ids = [str(uuid.uuid4()) for _ in range(ITEMS_BATCH_GET_MAX_IDS + 1)]
+    response = client.post(
+        f"{settings.API_V1_STR}/items/batch-get",
+        headers=superuser_token_headers,
+        json={"ids": ids},
+    )
+    assert response.status_code == 422
+
+
+def test_search_items(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    word = random_lower_string()
+    owner = create_random_user(db)
+    in_title = crud.create_item(
+        session=db,
+        item_in=ItemCreate(title=f"{word} report", description=f"About {word}"),
+        owner_id=owner.id,
+    )
+    in_description = crud.create_item(
+        session=db,
+        item_in=ItemCreate(title="Report", description=f"Mentions {word}"),
+        owner_id=owner.id,
+    )
+    crud.create_item(
+        session=db, item_in=ItemCreate(title="Unrelated"), owner_id=owner.id
+    )
+    response = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=superuser_token_headers,
+        params={"q": word},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    # Matching both the title and the description ranks higher
+    assert [item["id"] for item in content["data"]] == [
+        str(in_title.id),
+        str(in_description.id),
+    ]
+    assert content["next_cursor"] is None
+
+
+def test_search_items_pages(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    word = random_lower_string()
+    owner = create_random_user(db)
+    item_ids = {
+        str(
+            crud.create_item(
+                session=db, item_in=ItemCreate(title=word), owner_id=owner.id
+            ).id
+        )
+        for _ in range(5)
+    }
+    seen: list[str] = []
+    params = {"q": word, "limit": 2}
+    for _ in range(3):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/search",
+            headers=superuser_token_headers,
+            params=params,
+        )
+        assert response.status_code == 200
+        content = response.json()
+        seen.extend(item["id"] for item in content["data"])
+        params["cursor"] = content["next_cursor"]
+    assert params["cursor"] is None
+    assert len(seen) == 5
+    assert set(seen) == item_ids
+
+
+def test_search_items_only_owned(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    word = random_lower_string()
+    other = create_random_user(db)
+    crud.create_item(session=db, item_in=ItemCreate(title=word), owner_id=other.id)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=normal_user_token_headers,
+        params={"q": word},
+    )
+    assert response.status_code == 200
+    assert response.json()["data"] == []
+
+
+def test_search_items_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=superuser_token_headers,
+        params={"q": "report", "cursor": "not-a-cursor"},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_item_events_recorded(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    client.put(
+        f"{settings.API_V1_STR}/items/{item.id}",
+        headers=superuser_token_headers,
+        json={"title": "Updated"},
+    )
+    client.delete(
+        f"{settings.API_V1_STR}/items/{item.id}", headers=superuser_token_headers
+    )
+    # Changes to a deleted item aren't recorded
+    db.refresh(item)
+    item.title = "After delete"
+    db.add(item)
+    db.commit()
+
+    events = crud.get_item_events(
+        session=db, owner_id=item.owner_id, after_id=0, limit=10
+    )
+    assert [(event.item_id, event.type) for event in events] == [
+        (item.id, "created"),
+        (item.id, "updated"),
+        (item.id, "deleted"),
+    ]
+
+
+def test_stream_item_events_replays_missed_events(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    user = crud.get_user_by_email(session=db, email=settings.EMAIL_TEST_USER)
+    assert user
+    last_event_id = crud.get_last_item_event_id(session=db, owner_id=None)
+    own = crud.create_item(
+        session=db, item_in=ItemCreate(title="Foo"), owner_id=user.id
+    )
+    create_random_item(db)
+    # A closed subscription ends the stream after the replay
+    subscription = item_events.Subscription(user.id)
+    subscription.close()
+    with patch.object(
+        item_events.broker, "subscribe", AsyncMock(return_value=subscription)
+    ):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/events",
+            headers={**normal_user_token_headers, "Last-Event-ID": str(last_event_id)},
+        )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    messages = response.text.strip().split("\n\n")
+    assert len(messages) == 1
+    event_id, data = messages[0].split("\n")
+    assert int(event_id.removeprefix("id: ")) > last_event_id
+    event = json.loads(data.removeprefix("data: "))
+    assert event["item_id"] == str(own.id)
+    assert event["type"] == "created"
+
+
+def test_stream_item_events_replays_out_of_order_commits(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    with Session(engine) as session:
+        user = crud.get_user_by_email(session=session, email=settings.EMAIL_TEST_USER)
+        assert user
+        owner_id = user.id
+    early, late = (
+        Item(title="Early", owner_id=owner_id),
+        Item(title="Late", owner_id=owner_id),
+    )
+    item_ids = [early.id, late.id]
+    try:
+        with Session(engine) as first, Session(engine) as second:
+            # The first transaction takes the lower event id but commits last
+            first.add(early)
+            first.flush()
+            second.add(late)
+            second.commit()
+            first.commit()
+        with Session(engine) as session:
+            early_event, late_event = (
+                session.exec(
+                    select(ItemEvent).where(ItemEvent.item_id == item_id)
+                ).one()
+                for item_id in item_ids
+            )
+        assert early_event.id is not None and late_event.id is not None
+        assert early_event.id < late_event.id
+
+        # The client got the late event first, then disconnected
+        subscription = item_events.Subscription(owner_id)
+        subscription.close()
+        with patch.object(
+            item_events.broker, "subscribe", AsyncMock(return_value=subscription)
+        ):
+            response = client.get(
+                f"{settings.API_V1_STR}/items/events",
+                headers={
+                    **normal_user_token_headers,
+                    "Last-Event-ID": str(late_event.id),
+                },
+            )
+        assert response.status_code == 200
+        event_ids = [
+            int(message.split("\n")[0].removeprefix("id: "))
+            for message in response.text.strip().split("\n\n")
+        ]
+        assert early_event.id in event_ids
+    finally:
+        with engine.begin() as connection:
+            connection.execute(delete(Item).where(col(Item.id).in_(item_ids)))
+            connection.execute(
+                delete(ItemEvent).where(col(ItemEvent.item_id).in_(item_ids))
+            )
+
+
+def test_stream_item_events_reset(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    last_event_id = crud.get_last_item_event_id(session=db, owner_id=None)
+    create_random_item(db)
+    create_random_item(db)
+    subscription = item_events.Subscription(None)
+    subscription.close()
+    with (
+        patch.object(
+            item_events.broker, "subscribe", AsyncMock(return_value=subscription)
+        ),
+        patch("app.core.config.settings.ITEM_EVENTS_REPLAY_LIMIT", 1),
+    ):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/events",
+            headers={**superuser_token_headers, "Last-Event-ID": str(last_event_id)},
+        )
+    assert response.status_code == 200
+    last_id = crud.get_last_item_event_id(session=db, owner_id=None)
+    assert response.text == f"id: {last_id}\nevent: reset\ndata: {{}}\n\n"
+
+
+def test_stream_item_events_unavailable(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    # The listener couldn't connect to the database in time
+    with patch.object(
+        item_events.broker,
+        "subscribe",
+        AsyncMock(side_effect=asyncio.TimeoutError),
+    ):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/events", headers=normal_user_token_headers
+        )
+    assert response.status_code == 503
+    assert response.json() == {"detail": "Item events are unavailable"}
@@ -0,0 +1,113 @@
+import os
+import uuid
+from collections import Counter
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core import profiling
+from app.core.config import settings
+from tests.utils.utils import random_email, random_lower_string
+
+
+def test_profile_cpu(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/profiling/cpu",
+        headers=superuser_token_headers,
+        params={"seconds": 0.2},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-disposition"].startswith("attachment")
+    lines = r.text.splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert ";" in stack
+    assert int(count) > 0
+
+
+def test_profile_cpu_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/profiling/cpu",
+        headers=normal_user_token_headers,
+        params={"seconds": 0.2},
+    )
+    assert r.status_code == 403
+
+
+def _profiling_token(client: TestClient, headers: dict[str, str]) -> str:
+    r = client.post(f"{settings.API_V1_STR}/profiling/token", headers=headers)
+    assert r.status_code == 200
+    token: str = r.json()["access_token"]
+    return token
+
+
+def test_profile_request(
+    client: TestClient, superuser_token_headers: dict[str, str], tmp_path: Path
+) -> None:
+    token = _profiling_token(client, superuser_token_headers)
+    data = {"email": random_email(), "password": random_lower_string()}
+    with patch("app.core.config.settings.PROFILING_DIR", str(tmp_path)):
+        # Hashing the password keeps the endpoint busy for many samples
+        r = client.post(
+            f"{settings.API_V1_STR}/users/signup",
+            headers={"X-Profile-Token": token},
+            json=data,
+        )
+        assert r.status_code == 200
+        trace_id = r.headers["X-Profile-Trace-Id"]
+        r = client.get(
+            f"{settings.API_V1_STR}/profiling/traces/{trace_id}",
+            headers=superuser_token_headers,
+        )
+    assert r.status_code == 200
+    assert "register_user" in r.text
+
+
+def test_profile_request_invalid_token(client: TestClient) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/health-check/live/",
+        headers={"X-Profile-Token": "invalid"},
+    )
+    assert r.status_code == 403
+
+
+def test_profiling_token_is_not_an_access_token(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    token = _profiling_token(client, superuser_token_headers)
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert r.status_code == 403
+
+
+def test_read_trace_not_found(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/profiling/traces/00000000-0000-0000-0000-000000000000",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 404
+
+
+def test_save_trace_keeps_newest(tmp_path: Path) -> None:
+    trace_ids = [uuid.uuid4() for _ in range(3)]
+    stacks = Counter({"main;work": 1})
+    with (
+        patch("app.core.config.settings.PROFILING_DIR", str(tmp_path)),
+        patch("app.core.config.settings.PROFILING_MAX_TRACES", 2),
+    ):
+        for age, trace_id in zip([2000, 1000, 0], trace_ids, strict=True):
+            profiling.save_trace(trace_id, stacks)
+            path = tmp_path / f"{trace_id}.folded"
+            os.utime(path, (path.stat().st_mtime - age,) * 2)
+
+        assert profiling.load_trace(trace_ids[0]) is None
+        assert profiling.load_trace(trace_ids[1]) is not None
+        assert profiling.load_trace(trace_ids[2]) is not None
@@ -0,0 +1,206 @@
+import tracemalloc
+import uuid
+from collections.abc import Callable
+from contextlib import AbstractContextManager
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, func, insert, select
+
+from app import crud
+from app.core.config import settings
+from app.core.query_stats import QueryStats
+from app.models import Item, ItemCreate, UserCreate
+from tests.utils.item import create_random_item
+from tests.utils.user import create_random_user, user_authentication_headers
+from tests.utils.utils import random_email, random_lower_string
+
+QueryBudget = Callable[[int], AbstractContextManager[QueryStats]]
+
+
+@pytest.mark.parametrize(
+    "path,budget",
+    [
+        ("/users/me", 1),
+        ("/users/", 3),
+        ("/items/", 3),
+    ],
+)
+def test_read_query_budget(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    query_budget: QueryBudget,
+    path: str,
+    budget: int,
+) -> None:
+    with query_budget(budget):
+        r = client.get(f"{settings.API_V1_STR}{path}", headers=superuser_token_headers)
+    assert r.status_code == 200
+    assert int(r.headers["X-Query-Count"]) <= budget
+
+
+def test_read_item_query_budget(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    query_budget: QueryBudget,
+) -> None:
+    item = create_random_item(db)
+    with query_budget(2):
+        r = client.get(
+            f"{settings.API_V1_STR}/items/{item.id}", headers=superuser_token_headers
+        )
+    assert r.status_code == 200
+
+
+def test_batch_get_items_query_budget(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    query_budget: QueryBudget,
+) -> None:
+    ids = [str(create_random_item(db).id) for _ in range(5)]
+    with query_budget(2):
+        r = client.post(
+            f"{settings.API_V1_STR}/items/batch-get",
+            headers=superuser_token_headers,
+            json={"ids": ids},
+        )
+    assert r.status_code == 200
+    assert len(r.json()["data"]) == 5
+
+
+def test_create_item_query_budget(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    query_budget: QueryBudget,
+) -> None:
+    with query_budget(3):
+        r = client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            json={"title": "Foo"},
+        )
+    assert r.status_code == 200
+
+
+def test_update_item_query_budget(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    query_budget: QueryBudget,
+) -> None:
+    item = create_random_item(db)
+    with query_budget(4):
+        r = client.put(
+            f"{settings.API_V1_STR}/items/{item.id}",
+            headers=superuser_token_headers,
+            json={"title": "Updated"},
+        )
+    assert r.status_code == 200
+
+
+def test_signup_query_budget(client: TestClient, query_budget: QueryBudget) -> None:
+    data = {"email": random_email(), "password": random_lower_string()}
+    with query_budget(2):
+        r = client.post(f"{settings.API_V1_STR}/users/signup", json=data)
+    assert r.status_code == 200
+
+
+def test_delete_user_query_budget(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    query_budget: QueryBudget,
+) -> None:
+    user = create_random_user(db)
+    with query_budget(3):
+        r = client.delete(
+            f"{settings.API_V1_STR}/users/{user.id}", headers=superuser_token_headers
+        )
+    assert r.status_code == 200
+
+
+def test_delete_user_me_query_budget(
+    client: TestClient, db: Session, query_budget: QueryBudget
+) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    for _ in range(3):
+        crud.create_item(session=db, item_in=ItemCreate(title="Foo"), owner_id=user.id)
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    with query_budget(2):
+        r = client.delete(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+
+
+def test_delete_large_owner(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    query_budget: QueryBudget,
+) -> None:
+    user_id = create_random_user(db).id
+    db.execute(
+        insert(Item),
+        [
+            {"id": uuid.uuid4(), "title": f"Item {i}", "owner_id": user_id}
+            for i in range(20_000)
+        ],
+    )
+    db.commit()
+
+    tracemalloc.start()
+    try:
+        with query_budget(3):
+            r = client.delete(
+                f"{settings.API_V1_STR}/users/{user_id}",
+                headers=superuser_token_headers,
+            )
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert r.status_code == 200
+    # A single UPDATE, loading 20k items would take tens of MB
+    assert peak < 2 * 2**20
+    # Hidden with their owner
+    count = db.exec(
+        select(func.count()).select_from(Item).where(Item.owner_id == user_id)
+    ).one()
+    assert count == 0
+
+
+def test_hard_delete_large_owner(db: Session, query_budget: QueryBudget) -> None:
+    # As app/purge.py and session.delete() remove users, the items go with the
+    # ON DELETE CASCADE of the foreign key
+    user = create_random_user(db)
+    user_id = user.id
+    db.execute(
+        insert(Item),
+        [
+            {"id": uuid.uuid4(), "title": f"Item {i}", "owner_id": user_id}
+            for i in range(20_000)
+        ],
+    )
+    db.commit()
+    db.refresh(user)
+
+    tracemalloc.start()
+    try:
+        with query_budget(1):
+            db.delete(user)
+            db.commit()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # passive_deletes, loading 20k items would take tens of MB
+    assert peak < 2 * 2**20
+    count = (
+        db.connection()
+        .execute(select(func.count()).select_from(Item).where(Item.owner_id == user_id))
+        .scalar_one()
+    )
+    assert count == 0
@@ -1,13 +1,19 @@
+import json
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch
 
+from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
-from sqlmodel import Session, select
+from sqlmodel import Session, col, delete, select
 
 from app import crud
+from app.api.routes import users
 from app.core.config import settings
+from app.core.db import engine
 from app.core.security import verify_password
-from app.models import User, UserCreate
+from app.models import IdempotencyKey, ItemCreate, User, UserCreate, UserRegister
 from tests.utils.utils import random_email, random_lower_string
 
 
@@ -168,6 +174,61 @@ def test_retrieve_users(
         assert "email" in item
 
 
+def test_search_users(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    name = random_lower_string()[:12]
+    exact = crud.create_user(
+        session=db,
+        user_create=UserCreate(
+            email=f"{name}@example.com", password=random_lower_string()
+        ),
+    )
+    by_name = crud.create_user(
+        session=db,
+        user_create=UserCreate(
+            email=random_email(),
+            password=random_lower_string(),
+            full_name=f"{name.capitalize()} Smith",
+        ),
+    )
+    crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=random_lower_string()),
+    )
+
+    # A typo in the middle of the name
+    q = f"{name[:6]}x{name[7:]}"
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"q": q},
+    )
+    assert r.status_code == 200
+    ids = [user["id"] for user in r.json()["data"]]
+    assert set(ids) == {str(exact.id), str(by_name.id)}
+    assert r.json()["count"] == 2
+
+
+def test_search_users_prefix(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    name = random_lower_string()[:12]
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(
+            email=f"{name}@example.com", password=random_lower_string()
+        ),
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"q": name[:4]},
+    )
+    assert r.status_code == 200
+    assert str(user.id) in [user["id"] for user in r.json()["data"]]
+
+
 def test_update_user_me(
     client: TestClient, normal_user_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -191,6 +252,31 @@ def test_update_user_me(
     assert user_db.full_name == full_name
 
 
+def test_update_user_me_if_match(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    url = f"{settings.API_V1_STR}/users/me"
+    r = client.get(url, headers=normal_user_token_headers)
+    etag = r.headers["ETag"]
+    assert etag == f'"{r.json()["version"]}"'
+    r = client.patch(
+        url,
+        headers={**normal_user_token_headers, "If-Match": etag},
+        json={"full_name": "Updated Name"},
+    )
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    r = client.patch(
+        url,
+        headers={**normal_user_token_headers, "If-Match": etag},
+        json={"full_name": "Lost Name"},
+    )
+    assert r.status_code == 412
+    assert client.get(url, headers=normal_user_token_headers).json()["full_name"] == (
+        "Updated Name"
+    )
+
+
 def test_update_password_me(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -413,6 +499,42 @@ def test_delete_user_me(client: TestClient, db: Session) -> None:
     assert user_db is None
 
 
+def test_deleted_user_is_hidden_until_purged(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    item = crud.create_item(
+        session=db, item_in=ItemCreate(title="Foo"), owner_id=user.id
+    )
+    r = client.post(
+        f"{settings.API_V1_STR}/login/access-token",
+        data={"username": email, "password": password},
+    )
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    r = client.delete(
+        f"{settings.API_V1_STR}/users/{user.id}", headers=superuser_token_headers
+    )
+    assert r.status_code == 200
+
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 404
+    r = client.get(
+        f"{settings.API_V1_STR}/items/{item.id}", headers=superuser_token_headers
+    )
+    assert r.status_code == 404
+    # The email can be used again
+    r = client.post(
+        f"{settings.API_V1_STR}/users/signup",
+        json={"email": email, "password": password},
+    )
+    assert r.status_code == 200
+
+
 def test_delete_user_me_as_superuser(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -484,3 +606,55 @@ def test_delete_user_without_privileges(
     )
     assert r.status_code == 403
     assert r.json()["detail"] == "The user doesn't have enough privileges"
+
+
+def test_register_user_idempotency_key(client: TestClient, db: Session) -> None:
+    data = {"email": random_email(), "password": random_lower_string()}
+    headers = {"Idempotency-Key": random_lower_string()}
+    r = client.post(f"{settings.API_V1_STR}/users/signup", headers=headers, json=data)
+    assert r.status_code == 200
+    # The retry doesn't hash the password again
+    with patch("app.crud.get_password_hash") as get_password_hash:
+        retry = client.post(
+            f"{settings.API_V1_STR}/users/signup", headers=headers, json=data
+        )
+    get_password_hash.assert_not_called()
+    assert retry.status_code == 200
+    assert retry.json() == r.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    users = db.exec(select(User).where(User.email == data["email"])).all()
+    assert len(users) == 1
+
+    other = {"email": random_email(), "password": random_lower_string()}
+    r = client.post(f"{settings.API_V1_STR}/users/signup", headers=headers, json=other)
+    assert r.status_code == 422
+    assert r.json()["detail"] == "The Idempotency-Key was used for another request"
+
+
+def test_register_user_concurrent_retries() -> None:
+    user_in = UserRegister(email=random_email(), password=random_lower_string())
+    key = random_lower_string()
+    workers = 4
+    barrier = threading.Barrier(workers)
+
+    def signup() -> str:
+        with Session(engine) as session:
+            barrier.wait()
+            response = users.register_user(
+                session=session, user_in=user_in, idempotency_key=key
+            )
+            if isinstance(response, JSONResponse):
+                return str(json.loads(response.body)["id"])
+            return str(response.id)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            ids = list(executor.map(lambda _: signup(), range(workers)))
+        # One user, the others got its response
+        assert len(set(ids)) == 1
+    finally:
+        with engine.begin() as connection:
+            connection.execute(delete(User).where(col(User.email) == user_in.email))
+            connection.execute(
+                delete(IdempotencyKey).where(col(IdempotencyKey.key) == key)
+            )
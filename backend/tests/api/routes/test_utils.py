@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core import slow_queries
+from app.core.config import settings
+from app.models import HealthStatus
+
+
+def test_liveness(client: TestClient) -> None:
+    r = client.get(f"{settings.API_V1_STR}/utils/health-check/live/")
+    assert r.status_code == 200
+    assert r.json() is True
+
+
+def test_readiness(client: TestClient) -> None:
+    with patch("app.core.health._cached", None):
+        r = client.get(f"{settings.API_V1_STR}/utils/health-check/ready/")
+    assert r.status_code == 200
+    content = r.json()
+    assert content["ready"] is True
+    assert content["database_latency_ms"] > 0
+    assert 0 <= content["pool_usage"] < 1
+
+
+def test_readiness_pool_saturated(client: TestClient) -> None:
+    with (
+        patch("app.core.health._cached", None),
+        patch("app.core.config.settings.READINESS_MAX_POOL_USAGE", 0.0),
+    ):
+        r = client.get(f"{settings.API_V1_STR}/utils/health-check/ready/")
+    assert r.status_code == 503
+    content = r.json()
+    assert content["ready"] is False
+    assert content["detail"] == "Database pool saturated"
+
+
+def test_readiness_slow_database(client: TestClient) -> None:
+    with (
+        patch("app.core.health._cached", None),
+        patch("app.core.config.settings.READINESS_MAX_DB_LATENCY_MS", 0.0),
+    ):
+        r = client.get(f"{settings.API_V1_STR}/utils/health-check/ready/")
+    assert r.status_code == 503
+    assert r.json()["detail"] == "Database too slow"
+
+
+def test_readiness_is_cached(client: TestClient) -> None:
+    status = HealthStatus(ready=True, database_latency_ms=1.0, pool_usage=0.0)
+    with (
+        patch("app.core.health._cached", None),
+        patch("app.core.health._probe", return_value=status) as probe,
+    ):
+        for _ in range(3):
+            r = client.get(f"{settings.API_V1_STR}/utils/health-check/ready/")
+            assert r.status_code == 200
+    assert probe.call_count == 1
+
+
+def test_read_slow_queries(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    with (
+        patch("app.core.config.settings.SLOW_QUERY_THRESHOLD_MS", 0.0),
+        patch("app.core.slow_queries._queries", {}),
+    ):
+        r = client.get(f"{settings.API_V1_STR}/items/", headers=superuser_token_headers)
+        assert r.status_code == 200
+        # Wait for the plans queued so far
+        slow_queries._explain_executor.submit(lambda: None).result()
+        r = client.get(
+            f"{settings.API_V1_STR}/utils/slow-queries/",
+            headers=superuser_token_headers,
+            params={"limit": 100},
+        )
+    assert r.status_code == 200
+    queries = r.json()["data"]
+    items_query = next(
+        query
+        for query in queries
+        if query["route"] == "GET /api/v1/items/"
+        and query["statement"].startswith("SELECT item.")
+    )
+    assert items_query["count"] == 1
+    assert items_query["parameters"] == {"param_1": "int", "param_2": "int"}
+    assert items_query["plan"]
+
+
+def test_read_slow_queries_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/slow-queries/", headers=normal_user_token_headers
+    )
+    assert r.status_code == 403
@@ -0,0 +1,138 @@
+import uuid
+from collections.abc import Callable, Generator
+from dataclasses import dataclass
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, insert
+
+from app.core.db import engine
+from app.core.security import get_password_hash
+from app.models import Item, User
+from tests.utils.benchmark import (
+    BenchmarkResult,
+    benchmark_settings,
+    compare_to_baseline,
+    load_baseline,
+    run_benchmark,
+    write_results,
+)
+from tests.utils.user import user_authentication_headers
+from tests.utils.utils import random_lower_string
+
+BENCHMARK_PASSWORD = "benchmark-password"
+INSERT_BATCH_SIZE = 10_000
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fast_password_hashing() -> None:
+    # Benchmarks measure the production bcrypt cost
+    pass
+
+
+@pytest.fixture(scope="session", autouse=True)
+def db(database: None) -> Generator[Session, None, None]:  # noqa: ARG001
+    # Requests use their own sessions and commit for real, like in production
+    with Session(engine) as session:
+        yield session
+
+
+@dataclass
+class SeededData:
+    user_ids: list[uuid.UUID]
+    item_ids: list[uuid.UUID]
+    owner_email: str
+
+
+@pytest.fixture(scope="session")
+def seeded(db: Session) -> SeededData:
+    """
+    Bulk insert the configured volume of users and items.
+
+    Every seeded user shares one precomputed password hash, so seeding doesn't
+    pay for bcrypt per row and any of them can log in.
+    """
+    hashed_password = get_password_hash(BENCHMARK_PASSWORD)
+    run_id = random_lower_string()[:8]
+    users = [
+        {
+            "id": uuid.uuid4(),
+            "email": f"bench-{run_id}-{i}@example.com",
+            "full_name": f"Benchmark User {i}",
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "is_superuser": False,
+        }
+        for i in range(benchmark_settings.USERS)
+    ]
+    for start in range(0, len(users), INSERT_BATCH_SIZE):
+        db.execute(insert(User), users[start : start + INSERT_BATCH_SIZE])
+
+    item_ids: list[uuid.UUID] = []
+    batch: list[dict[str, Any]] = []
+    for user in users:
+        for i in range(benchmark_settings.ITEMS_PER_USER):
+            item_id = uuid.uuid4()
+            item_ids.append(item_id)
+            batch.append(
+                {
+                    "id": item_id,
+                    "title": f"Item {i}",
+                    "description": random_lower_string(),
+                    "owner_id": user["id"],
+                }
+            )
+            if len(batch) == INSERT_BATCH_SIZE:
+                db.execute(insert(Item), batch)
+                batch = []
+    if batch:
+        db.execute(insert(Item), batch)
+    db.commit()
+    return SeededData(
+        user_ids=[user["id"] for user in users],
+        item_ids=item_ids,
+        owner_email=users[0]["email"],
+    )
+
+
+@pytest.fixture(scope="module")
+def owner_token_headers(client: TestClient, seeded: SeededData) -> dict[str, str]:
+    return user_authentication_headers(
+        client=client, email=seeded.owner_email, password=BENCHMARK_PASSWORD
+    )
+
+
+@pytest.fixture(scope="session")
+def benchmark_results() -> Generator[list[BenchmarkResult], None, None]:
+    results: list[BenchmarkResult] = []
+    yield results
+    if not results:
+        return
+    write_results(benchmark_settings.OUTPUT, results)
+    if benchmark_settings.SAVE_BASELINE:
+        write_results(benchmark_settings.BASELINE, results)
+
+
+@pytest.fixture(scope="session")
+def benchmark_baseline() -> dict[str, dict[str, Any]]:
+    if benchmark_settings.SAVE_BASELINE:
+        return {}
+    return load_baseline(benchmark_settings.BASELINE)
+
+
+@pytest.fixture()
+def benchmark(
+    benchmark_results: list[BenchmarkResult],
+    benchmark_baseline: dict[str, dict[str, Any]],
+) -> Callable[..., BenchmarkResult]:
+    def _benchmark(
+        name: str, call: Callable[[Any], Any], **kwargs: Any
+    ) -> BenchmarkResult:
+        result = run_benchmark(name, call, **kwargs)
+        benchmark_results.append(result)
+        regressions = compare_to_baseline(result, benchmark_baseline)
+        assert not regressions, "; ".join(regressions)
+        return result
+
+    return _benchmark
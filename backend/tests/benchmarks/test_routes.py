@@ -0,0 +1,366 @@
+import random
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import crud
+from app.core.config import settings
+from app.models import ItemCreate, UserCreate
+from tests.benchmarks.conftest import BENCHMARK_PASSWORD, SeededData
+from tests.utils.benchmark import BenchmarkResult, benchmark_settings
+from tests.utils.item import create_random_item
+from tests.utils.user import create_random_user, user_authentication_headers
+from tests.utils.utils import random_email, random_lower_string
+
+pytestmark = pytest.mark.skipif(
+    not benchmark_settings.ENABLED,
+    reason="Benchmarks only run with BENCHMARK_ENABLED=true",
+)
+
+Benchmark = Callable[..., BenchmarkResult]
+
+API = settings.API_V1_STR
+# Concurrent identical requests of the herd benchmarks
+HERD_SIZE = 20
+
+
+def test_login_access_token(
+    benchmark: Benchmark, client: TestClient, seeded: SeededData
+) -> None:
+    data = {"username": seeded.owner_email, "password": BENCHMARK_PASSWORD}
+    benchmark(
+        "login.access_token",
+        lambda _: client.post(f"{API}/login/access-token", data=data),
+    )
+
+
+def test_login_test_token(
+    benchmark: Benchmark, client: TestClient, owner_token_headers: dict[str, str]
+) -> None:
+    benchmark(
+        "login.test_token",
+        lambda _: client.post(f"{API}/login/test-token", headers=owner_token_headers),
+    )
+
+
+def test_health_check(benchmark: Benchmark, client: TestClient) -> None:
+    benchmark("utils.health_check", lambda _: client.get(f"{API}/utils/health-check/"))
+
+
+@pytest.mark.parametrize("skip", benchmark_settings.PAGE_DEPTHS)
+def test_read_items_superuser(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    seeded: SeededData,  # noqa: ARG001
+    skip: int,
+) -> None:
+    params = {"skip": skip, "limit": benchmark_settings.PAGE_SIZE}
+    benchmark(
+        f"items.list.superuser.skip_{skip}",
+        lambda _: client.get(
+            f"{API}/items/", headers=superuser_token_headers, params=params
+        ),
+    )
+
+
+def test_read_items_owner(
+    benchmark: Benchmark, client: TestClient, owner_token_headers: dict[str, str]
+) -> None:
+    params = {"limit": benchmark_settings.PAGE_SIZE}
+    benchmark(
+        "items.list.owner",
+        lambda _: client.get(
+            f"{API}/items/", headers=owner_token_headers, params=params
+        ),
+    )
+
+
+@pytest.mark.parametrize("single_flight", [False, True])
+def test_read_items_herd(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    seeded: SeededData,  # noqa: ARG001
+    single_flight: bool,
+) -> None:
+    """
+    The same page requested by HERD_SIZE clients at once, timed until the last
+    response.
+    """
+    params = {"limit": benchmark_settings.PAGE_SIZE}
+
+    def get(_: int) -> Any:
+        return client.get(
+            f"{API}/items/", headers=superuser_token_headers, params=params
+        )
+
+    def call(_: Any) -> Any:
+        with ThreadPoolExecutor(max_workers=HERD_SIZE) as executor:
+            responses = list(executor.map(get, range(HERD_SIZE)))
+        assert all(response.status_code == 200 for response in responses)
+        return responses[-1]
+
+    with patch("app.core.config.settings.SINGLE_FLIGHT_ENABLED", single_flight):
+        benchmark(
+            f"items.list.herd.single_flight_{'on' if single_flight else 'off'}", call
+        )
+
+
+def test_read_items_filtered(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    seeded: SeededData,  # noqa: ARG001
+) -> None:
+    params = {
+        "title": "Item 1",
+        "sort": "title",
+        "limit": benchmark_settings.PAGE_SIZE,
+    }
+    benchmark(
+        "items.list.superuser.filtered",
+        lambda _: client.get(
+            f"{API}/items/", headers=superuser_token_headers, params=params
+        ),
+    )
+
+
+def test_read_item(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    seeded: SeededData,
+) -> None:
+    benchmark(
+        "items.read",
+        lambda _: client.get(
+            f"{API}/items/{random.choice(seeded.item_ids)}",
+            headers=superuser_token_headers,
+        ),
+    )
+
+
+def test_batch_get_items(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    seeded: SeededData,
+) -> None:
+    def call(_: Any) -> Any:
+        ids = random.sample(seeded.item_ids, benchmark_settings.PAGE_SIZE)
+        return client.post(
+            f"{API}/items/batch-get",
+            headers=superuser_token_headers,
+            json={"ids": [str(id) for id in ids]},
+        )
+
+    benchmark("items.batch_get", call)
+
+
+def test_batch(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    seeded: SeededData,
+) -> None:
+    def call(_: Any) -> Any:
+        requests = [
+            {"method": "GET", "path": f"/items/{item_id}"}
+            for item_id in random.sample(seeded.item_ids, 10)
+        ]
+        return client.post(
+            f"{API}/batch/",
+            headers=superuser_token_headers,
+            json={"requests": requests},
+        )
+
+    benchmark("batch.items_read_10", call)
+
+
+def test_create_item(
+    benchmark: Benchmark, client: TestClient, owner_token_headers: dict[str, str]
+) -> None:
+    benchmark(
+        "items.create",
+        lambda _: client.post(
+            f"{API}/items/",
+            headers=owner_token_headers,
+            json={"title": random_lower_string(), "description": "benchmark"},
+        ),
+    )
+
+
+def test_update_item(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    seeded: SeededData,
+) -> None:
+    benchmark(
+        "items.update",
+        lambda _: client.put(
+            f"{API}/items/{random.choice(seeded.item_ids)}",
+            headers=superuser_token_headers,
+            json={"title": random_lower_string()},
+        ),
+    )
+
+
+def test_delete_item(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+) -> None:
+    def call(item_id: uuid.UUID) -> Any:
+        return client.delete(f"{API}/items/{item_id}", headers=superuser_token_headers)
+
+    benchmark("items.delete", call, setup=lambda: create_random_item(db).id)
+
+
+@pytest.mark.parametrize("skip", benchmark_settings.PAGE_DEPTHS)
+def test_read_users(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    seeded: SeededData,  # noqa: ARG001
+    skip: int,
+) -> None:
+    params = {"skip": skip, "limit": benchmark_settings.PAGE_SIZE}
+    benchmark(
+        f"users.list.skip_{skip}",
+        lambda _: client.get(
+            f"{API}/users/", headers=superuser_token_headers, params=params
+        ),
+    )
+
+
+def test_search_users(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    seeded: SeededData,
+) -> None:
+    # The start of the email with a typo
+    local_part = seeded.owner_email.split("@")[0]
+    q = local_part[:-2] + "x" + local_part[-1]
+    benchmark(
+        "users.search",
+        lambda _: client.get(
+            f"{API}/users/",
+            headers=superuser_token_headers,
+            params={"q": q, "limit": 10},
+        ),
+    )
+
+
+def test_read_user_me(
+    benchmark: Benchmark, client: TestClient, owner_token_headers: dict[str, str]
+) -> None:
+    benchmark(
+        "users.read_me",
+        lambda _: client.get(f"{API}/users/me", headers=owner_token_headers),
+    )
+
+
+def test_read_user_by_id(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    seeded: SeededData,
+) -> None:
+    benchmark(
+        "users.read",
+        lambda _: client.get(
+            f"{API}/users/{random.choice(seeded.user_ids)}",
+            headers=superuser_token_headers,
+        ),
+    )
+
+
+def test_create_user(
+    benchmark: Benchmark, client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    benchmark(
+        "users.create",
+        lambda _: client.post(
+            f"{API}/users/",
+            headers=superuser_token_headers,
+            json={"email": random_email(), "password": random_lower_string()},
+        ),
+    )
+
+
+def test_register_user(benchmark: Benchmark, client: TestClient) -> None:
+    benchmark(
+        "users.signup",
+        lambda _: client.post(
+            f"{API}/users/signup",
+            json={"email": random_email(), "password": random_lower_string()},
+        ),
+    )
+
+
+def test_update_user(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    seeded: SeededData,
+) -> None:
+    benchmark(
+        "users.update",
+        lambda _: client.patch(
+            f"{API}/users/{random.choice(seeded.user_ids)}",
+            headers=superuser_token_headers,
+            json={"full_name": random_lower_string()},
+        ),
+    )
+
+
+def test_update_user_me(
+    benchmark: Benchmark, client: TestClient, owner_token_headers: dict[str, str]
+) -> None:
+    benchmark(
+        "users.update_me",
+        lambda _: client.patch(
+            f"{API}/users/me",
+            headers=owner_token_headers,
+            json={"full_name": random_lower_string()},
+        ),
+    )
+
+
+def test_delete_user(
+    benchmark: Benchmark,
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+) -> None:
+    def call(user_id: uuid.UUID) -> Any:
+        return client.delete(f"{API}/users/{user_id}", headers=superuser_token_headers)
+
+    benchmark("users.delete", call, setup=lambda: create_random_user(db).id)
+
+
+def test_delete_user_me(benchmark: Benchmark, client: TestClient, db: Session) -> None:
+    def setup() -> dict[str, str]:
+        user_in = UserCreate(email=random_email(), password=BENCHMARK_PASSWORD)
+        user = crud.create_user(session=db, user_create=user_in)
+        item_in = ItemCreate(title=random_lower_string())
+        crud.create_item(session=db, item_in=item_in, owner_id=user.id)
+        return user_authentication_headers(
+            client=client, email=user.email, password=BENCHMARK_PASSWORD
+        )
+
+    benchmark(
+        "users.delete_me",
+        lambda headers: client.delete(f"{API}/users/me", headers=headers),
+        setup=setup,
+    )
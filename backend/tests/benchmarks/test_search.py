@@ -0,0 +1,98 @@
+import random
+import time
+import uuid
+from collections.abc import Callable
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, col, insert, or_, select
+
+from app.core.config import settings
+from app.models import Item
+from tests.benchmarks.conftest import SeededData
+from tests.utils.benchmark import BenchmarkResult, benchmark_settings, summarize
+
+pytestmark = pytest.mark.skipif(
+    not benchmark_settings.ENABLED,
+    reason="Benchmarks only run with BENCHMARK_ENABLED=true",
+)
+
+Benchmark = Callable[..., BenchmarkResult]
+
+API = settings.API_V1_STR
+# Rare enough that a scan can't stop early, like most real searches
+NEEDLE = "haystackneedle"
+NEEDLES = 50
+
+
+@pytest.fixture(scope="module")
+def needles(db: Session, seeded: SeededData) -> None:
+    owners = [seeded.user_ids[0], *random.sample(seeded.user_ids, NEEDLES - 1)]
+    db.execute(
+        insert(Item),
+        [
+            {
+                "id": uuid.uuid4(),
+                "title": f"Report {i}",
+                "description": f"Find the {NEEDLE} in the items",
+                "owner_id": owner_id,
+                "deleted_at": None,
+            }
+            for i, owner_id in enumerate(owners)
+        ],
+    )
+    db.commit()
+
+
+@pytest.mark.usefixtures("needles")
+def test_search_items_superuser(
+    benchmark: Benchmark, client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    benchmark(
+        "items.search.superuser",
+        lambda _: client.get(
+            f"{API}/items/search",
+            headers=superuser_token_headers,
+            params={"q": NEEDLE},
+        ),
+    )
+
+
+@pytest.mark.usefixtures("needles")
+def test_search_items_owner(
+    benchmark: Benchmark, client: TestClient, owner_token_headers: dict[str, str]
+) -> None:
+    benchmark(
+        "items.search.owner",
+        lambda _: client.get(
+            f"{API}/items/search", headers=owner_token_headers, params={"q": NEEDLE}
+        ),
+    )
+
+
+@pytest.mark.usefixtures("needles")
+def test_ilike_scan(db: Session, benchmark_results: list[BenchmarkResult]) -> None:
+    """
+    The query the search replaces, for comparison with items.search.superuser.
+    It's timed in the database only, without the HTTP round trip.
+    """
+    pattern = f"%{NEEDLE}%"
+    statement = (
+        select(Item)
+        .where(
+            or_(col(Item.title).ilike(pattern), col(Item.description).ilike(pattern))
+        )
+        .order_by(col(Item.id))
+        .limit(20)
+    )
+    rounds = max(benchmark_settings.ROUNDS, 2)
+    latencies = []
+    for i in range(benchmark_settings.WARMUP_ROUNDS + rounds):
+        start = time.perf_counter()
+        items = db.exec(statement).all()
+        elapsed = time.perf_counter() - start
+        db.expunge_all()
+        assert items
+        if i >= benchmark_settings.WARMUP_ROUNDS:
+            latencies.append(elapsed)
+    benchmark_results.append(summarize("items.search.ilike_scan", latencies))
@@ -1,29 +1,138 @@
-from collections.abc import Generator
+import json
+import os
+import time
+from collections.abc import Callable, Generator, Iterator
+from contextlib import AbstractContextManager, contextmanager
+from pathlib import Path
+from typing import Any
 
 import pytest
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 from fastapi.testclient import TestClient
-from sqlmodel import Session, delete
+from sqlalchemy import event, text
+from sqlmodel import Session, SQLModel, delete
 
+from app.api.deps import get_db
+from app.core import security
 from app.core.config import settings
 from app.core.db import engine, init_db
+from app.core.query_stats import QueryStats
+from app.core.readiness import ALEMBIC_DIR
 from app.main import app
 from app.models import Item, User
 from tests.utils.user import authentication_token_from_email
 from tests.utils.utils import get_superuser_token_headers
 
+# Set by pytest-xdist, each worker gets its own schema so they can't collide
+XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER")
+TEST_METRICS_OUTPUT = Path(os.environ.get("TEST_METRICS_OUTPUT", "test-metrics.json"))
+# bcrypt's minimum cost, hashing at the production cost dominates the suite
+FAST_HASH_ROUNDS = 4
+start_time_key = pytest.StashKey[float]()
+
+
+def pytest_sessionstart(session: pytest.Session) -> None:
+    session.config.stash[start_time_key] = time.perf_counter()
+
+
+def pytest_sessionfinish(session: pytest.Session, exitstatus: int) -> None:
+    if XDIST_WORKER is not None:
+        return
+    metrics = {
+        "wall_seconds": round(
+            time.perf_counter() - session.config.stash[start_time_key], 2
+        ),
+        "tests": session.testscollected,
+        "failed": session.testsfailed,
+        "workers": session.config.getoption("numprocesses", None) or 0,
+        "exit_status": int(exitstatus),
+    }
+    TEST_METRICS_OUTPUT.write_text(json.dumps(metrics, indent=2))
+
 
 @pytest.fixture(scope="session", autouse=True)
-def db() -> Generator[Session, None, None]:
+def fast_password_hashing() -> None:
+    security.pwd_context.update(bcrypt__rounds=FAST_HASH_ROUNDS)
+
+
+def _create_worker_schema(schema: str) -> None:
+    @event.listens_for(engine, "connect", insert=True)
+    def set_search_path(dbapi_connection: Any, _connection_record: Any) -> None:
+        # Outside of a transaction, a rollback would undo the SET
+        autocommit = dbapi_connection.autocommit
+        dbapi_connection.autocommit = True
+        with dbapi_connection.cursor() as cursor:
+            # public for the extensions, like pg_trgm
+            cursor.execute(f'SET SESSION search_path TO "{schema}", public')
+        dbapi_connection.autocommit = autocommit
+
+    engine.dispose()
+    with engine.begin() as connection:
+        connection.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
+        connection.execute(text(f'CREATE SCHEMA "{schema}"'))
+        connection.execute(text(f'SET LOCAL search_path TO "{schema}", public'))
+        # The tables of public are visible too, don't skip creating them
+        SQLModel.metadata.create_all(connection, checkfirst=False)
+        # Without public, Alembic would find and stamp its version table
+        connection.execute(text(f'SET LOCAL search_path TO "{schema}"'))
+        config = Config()
+        config.set_main_option("script_location", str(ALEMBIC_DIR))
+        MigrationContext.configure(connection).stamp(
+            ScriptDirectory.from_config(config), "heads"
+        )
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database(fast_password_hashing: None) -> Generator[None, None, None]:  # noqa: ARG001
+    """
+    Set up the data shared by every test, committed for real: the superuser.
+    """
+    schema = f"test_{XDIST_WORKER}" if XDIST_WORKER else None
+    if schema:
+        _create_worker_schema(schema)
     with Session(engine) as session:
         init_db(session)
-        yield session
-        statement = delete(Item)
-        session.execute(statement)
-        statement = delete(User)
-        session.execute(statement)
+    yield
+    if schema:
+        with engine.begin() as connection:
+            connection.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+        return
+    with Session(engine) as session:
+        session.execute(delete(Item))
+        session.execute(delete(User))
         session.commit()
 
 
+@pytest.fixture(autouse=True)
+def db(database: None) -> Generator[Session, None, None]:  # noqa: ARG001
+    """
+    A session in a transaction rolled back after the test.
+
+    Requests get their own sessions in the same transaction, commits, in the
+    test or in a request, only release a SAVEPOINT.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+
+    def get_test_db() -> Generator[Session, None, None]:
+        with Session(
+            bind=connection, join_transaction_mode="create_savepoint"
+        ) as request_session:
+            yield request_session
+
+    app.dependency_overrides[get_db] = get_test_db
+    try:
+        yield session
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
 @pytest.fixture(scope="module")
 def client() -> Generator[TestClient, None, None]:
     with TestClient(app) as c:
@@ -36,7 +145,34 @@ def superuser_token_headers(client: TestClient) -> dict[str, str]:
 
 
 @pytest.fixture(scope="module")
-def normal_user_token_headers(client: TestClient, db: Session) -> dict[str, str]:
-    return authentication_token_from_email(
-        client=client, email=settings.EMAIL_TEST_USER, db=db
-    )
+def normal_user_token_headers(client: TestClient) -> dict[str, str]:
+    # Committed, the token is used across the tests of the module
+    with Session(engine) as session:
+        return authentication_token_from_email(
+            client=client, email=settings.EMAIL_TEST_USER, db=session
+        )
+
+
+@pytest.fixture()
+def query_budget() -> Callable[[int], AbstractContextManager[QueryStats]]:
+    """
+    Fail the test if the block runs more than `max_queries` SQL statements.
+    """
+
+    @contextmanager
+    def _query_budget(max_queries: int) -> Iterator[QueryStats]:
+        stats = QueryStats()
+
+        def record(_conn: Any, _cursor: Any, statement: str, *_args: Any) -> None:
+            stats.record(statement)
+
+        event.listen(engine, "after_cursor_execute", record)
+        try:
+            yield stats
+        finally:
+            event.remove(engine, "after_cursor_execute", record)
+        assert (
+            stats.count <= max_queries
+        ), f"{stats.count} queries over a budget of {max_queries}:\n{stats.report()}"
+
+    return _query_budget
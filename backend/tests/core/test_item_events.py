@@ -0,0 +1,141 @@
+import asyncio
+import uuid
+from collections.abc import AsyncIterator
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from sqlmodel import Session, col, delete
+
+from app import crud
+from app.core import item_events
+from app.core.db import engine
+from app.core.item_events import ItemEventBroker, Subscription
+from app.models import ItemCreate, ItemEvent, ItemEventPublic, User
+from tests.utils.user import create_random_user
+
+
+def _event(event_id: int, owner_id: uuid.UUID) -> ItemEventPublic:
+    return ItemEventPublic(
+        id=event_id,
+        item_id=uuid.uuid4(),
+        owner_id=owner_id,
+        type="created",
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+async def _collect(messages: AsyncIterator[str]) -> list[str]:
+    return [message async for message in messages]
+
+
+def test_publish_to_owners_and_superusers() -> None:
+    broker = ItemEventBroker("")
+    owner, other = uuid.uuid4(), uuid.uuid4()
+    owned, others, everything = (
+        Subscription(owner),
+        Subscription(other),
+        Subscription(None),
+    )
+    broker.subscriptions = {owned, others, everything}
+
+    broker.publish(_event(1, owner))
+
+    assert owned.queue.qsize() == 1
+    assert others.queue.empty()
+    assert everything.queue.qsize() == 1
+
+
+def test_publish_drops_slow_subscribers() -> None:
+    broker = ItemEventBroker("")
+    owner = uuid.uuid4()
+    slow = Subscription(owner)
+    broker.subscriptions = {slow}
+
+    with patch("app.core.config.settings.ITEM_EVENTS_QUEUE_SIZE", 2):
+        for event_id in range(3):
+            broker.publish(_event(event_id, owner))
+
+    assert broker.subscriptions == set()
+    # The stream ends, the client resumes from the last event it got
+    assert slow.queue.get_nowait() is None
+
+
+def test_stream_replays_then_follows() -> None:
+    owner = uuid.uuid4()
+    subscription = Subscription(owner)
+    replayed = [_event(1, owner), _event(2, owner)]
+    # Committed while replaying, queued as well
+    subscription.queue.put_nowait(replayed[1])
+    subscription.queue.put_nowait(_event(3, owner))
+    subscription.queue.put_nowait(None)
+
+    messages = asyncio.run(_collect(item_events.stream(subscription, replayed)))
+
+    assert [message.split("\n")[0] for message in messages] == [
+        "id: 1",
+        "id: 2",
+        "id: 3",
+    ]
+
+
+def test_stream_reset() -> None:
+    subscription = Subscription(None)
+    subscription.close()
+
+    messages = asyncio.run(_collect(item_events.stream(subscription, [], reset_id=42)))
+
+    assert messages == ["id: 42\nevent: reset\ndata: {}\n\n"]
+
+
+def test_stream_keepalive() -> None:
+    subscription = Subscription(None)
+
+    async def first_message() -> str:
+        messages = item_events.stream(subscription, [])
+        try:
+            return await messages.__anext__()
+        finally:
+            await messages.aclose()
+
+    with patch("app.core.config.settings.ITEM_EVENTS_KEEPALIVE_SECONDS", 0.01):
+        message = asyncio.run(first_message())
+
+    assert message == ": keepalive\n\n"
+
+
+def test_listen_for_committed_changes() -> None:
+    with Session(engine) as session:
+        user = create_random_user(session)
+    broker = ItemEventBroker(item_events.broker.conninfo)
+
+    def create_item() -> uuid.UUID:
+        with Session(engine) as session:
+            item = crud.create_item(
+                session=session, item_in=ItemCreate(title="Foo"), owner_id=user.id
+            )
+            return item.id
+
+    async def listen() -> tuple[uuid.UUID, ItemEventPublic | None]:
+        try:
+            subscription = await broker.subscribe(user.id)
+            item_id = await asyncio.to_thread(create_item)
+            event = await asyncio.wait_for(subscription.queue.get(), 5)
+            # Published once
+            await asyncio.sleep(0.2)
+            assert subscription.queue.empty()
+            return item_id, event
+        finally:
+            await broker.stop()
+
+    try:
+        item_id, event = asyncio.run(listen())
+
+        assert event is not None
+        assert event.item_id == item_id
+        assert event.type == "created"
+    finally:
+        with engine.begin() as connection:
+            connection.execute(delete(User).where(col(User.id) == user.id))
+            connection.execute(
+                delete(ItemEvent).where(col(ItemEvent.owner_id) == user.id)
+            )
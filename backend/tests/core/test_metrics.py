@@ -0,0 +1,84 @@
+import json
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import metrics
+from app.core.config import settings
+
+
+def test_read_metrics(client: TestClient) -> None:
+    client.get(f"{settings.API_V1_STR}/utils/health-check/")
+    r = client.get(f"{settings.API_V1_STR}/utils/metrics/")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    lines = r.text.splitlines()
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert any(
+        line.startswith(
+            'http_requests_total{method="GET",route="/api/v1/utils/health-check/",'
+            'status="200"}'
+        )
+        for line in lines
+    )
+    assert any(line.startswith("db_pool_checked_out ") for line in lines)
+
+
+def _write_worker(
+    directory: Path, pid: int, requests: float, gauge: float, name: str = ""
+) -> Path:
+    snapshot = {
+        "http_requests_total": [[["GET", "/test", "200"], requests]],
+        "password_hash_inprogress": [[[], gauge]],
+    }
+    path = directory / f"{name or pid}.json"
+    path.write_text(json.dumps({"pid": pid, "metrics": snapshot}))
+    return path
+
+
+def _sample(text: str, prefix: str) -> float:
+    line = next(line for line in text.splitlines() if line.startswith(prefix))
+    return float(line.rsplit(" ", 1)[1])
+
+
+def test_metrics_aggregate_workers(tmp_path: Path) -> None:
+    live_pid = os.getppid()
+    dead_pid = 2**22 + 1  # Above the default pid_max
+    _write_worker(tmp_path, live_pid, requests=3, gauge=2)
+    dead = _write_worker(tmp_path, dead_pid, requests=4, gauge=5)
+    with patch("app.core.config.settings.METRICS_MULTIPROC_DIR", str(tmp_path)):
+        text = metrics.render()
+    assert list(tmp_path.glob(f"{os.getpid()}-*.json"))
+    # Folded into retired.json
+    assert not dead.exists()
+    # Counters keep the requests of workers that exited, gauges don't
+    requests = 'http_requests_total{method="GET",route="/test",status="200"}'
+    assert _sample(text, requests) == 7
+    assert _sample(text, "password_hash_inprogress ") == 2
+
+
+def test_metrics_keep_workers_with_a_reused_pid(tmp_path: Path) -> None:
+    requests = 'http_requests_total{method="GET",route="/test",status="200"}'
+    with patch("app.core.config.settings.METRICS_MULTIPROC_DIR", str(tmp_path)):
+        _write_worker(tmp_path, 2**22 + 1, requests=4, gauge=5, name="retired-1")
+        before = _sample(metrics.render(), requests)
+        # A previous worker had this worker's pid, its file is kept apart
+        _write_worker(tmp_path, os.getpid(), requests=6, gauge=5, name="previous")
+        _write_worker(tmp_path, 2**22 + 2, requests=1, gauge=5, name="retired-2")
+        text = metrics.render()
+        assert _sample(text, requests) == before + 7
+        assert _sample(metrics.render(), requests) == before + 7
+    names = {path.name for path in tmp_path.glob("*.json")}
+    assert names == {"retired.json", metrics._snapshot_path(tmp_path).name}
+
+
+def test_metric_without_collect() -> None:
+    class Incomplete(metrics.Metric):
+        type = "counter"
+
+    # Fails when it's created, rather than when it's scraped
+    with pytest.raises(TypeError):
+        Incomplete("incomplete_total", "Incomplete.")  # type: ignore[abstract]
@@ -0,0 +1,50 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.core.readiness import Check, wait_until_ready
+
+
+def flaky(failures: int) -> MagicMock:
+    return MagicMock(side_effect=[ConnectionError()] * failures + [None])
+
+
+def test_retries_until_ready() -> None:
+    probe = flaky(3)
+    start = time.perf_counter()
+    (result,) = wait_until_ready([Check("database", probe)])
+
+    assert result.ready
+    assert result.attempts == 4
+    # The first retries back off by tens of milliseconds, not seconds
+    assert time.perf_counter() - start < 2
+
+
+def test_required_check_raises_after_max_wait() -> None:
+    probe = MagicMock(side_effect=ConnectionError("refused"))
+    with pytest.raises(ConnectionError, match="refused"):
+        wait_until_ready([Check("database", probe)], max_wait_seconds=0.2)
+    assert probe.call_count > 1
+
+
+def test_optional_check_is_tried_once() -> None:
+    probe = MagicMock(side_effect=ConnectionError())
+    database, smtp = wait_until_ready(
+        [Check("database", MagicMock()), Check("smtp", probe, required=False)]
+    )
+
+    assert database.ready
+    assert not smtp.ready
+    assert probe.call_count == 1
+
+
+def test_checks_run_in_parallel() -> None:
+    def probe() -> None:
+        time.sleep(0.3)
+
+    start = time.perf_counter()
+    results = wait_until_ready([Check(str(i), probe) for i in range(3)])
+
+    assert all(result.ready for result in results)
+    assert time.perf_counter() - start < 0.6
@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.routes import items
+from app.core import single_flight
+from app.core.config import settings
+from app.core.metrics import SINGLE_FLIGHT_FAN_IN
+from app.core.single_flight import SingleFlight
+
+WORKERS = 5
+
+
+def _fan_in(name: str) -> tuple[int, float]:
+    samples = dict(SINGLE_FLIGHT_FAN_IN.collect())
+    sample = samples.get((name,), {"count": 0, "sum": 0.0})
+    return sample["count"], sample["sum"]
+
+
+def _run_concurrently(flight: SingleFlight, key: str, function: object) -> list[object]:
+    """
+    Call `flight.do` from WORKERS threads, the first one blocks in `function`
+    until every other one waits for it.
+    """
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow() -> object:
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return function() if callable(function) else function
+
+    def worker() -> object:
+        try:
+            return flight.do(key, slow)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        leader = executor.submit(worker)
+        started.wait(5)
+        followers = [executor.submit(worker) for _ in range(WORKERS - 1)]
+        # Every follower is waiting once the call has them all
+        while flight._calls[key].requests < WORKERS:
+            threading.Event().wait(0.001)
+        release.set()
+        results = [leader.result()] + [future.result() for future in followers]
+    assert len(calls) == 1
+    return results
+
+
+def test_concurrent_calls_share_one_execution() -> None:
+    flight = SingleFlight("test.shared")
+    result = object()
+    with patch("app.core.config.settings.SINGLE_FLIGHT_ENABLED", True):
+        results = _run_concurrently(flight, "key", result)
+
+    assert results == [result] * WORKERS
+    assert _fan_in("test.shared") == (1, WORKERS)
+    # Nothing is kept once the call returned
+    assert flight._calls == {}
+
+
+def test_concurrent_calls_share_the_error() -> None:
+    flight = SingleFlight("test.error")
+
+    def fail() -> None:
+        raise ValueError("boom")
+
+    with patch("app.core.config.settings.SINGLE_FLIGHT_ENABLED", True):
+        results = _run_concurrently(flight, "key", fail)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight._calls == {}
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_sequential_or_disabled_calls_run_each_time(enabled: bool) -> None:
+    flight = SingleFlight("test.sequential")
+    calls = []
+    with patch("app.core.config.settings.SINGLE_FLIGHT_ENABLED", enabled):
+        for _ in range(3):
+            flight.do("key", lambda: calls.append(1))
+        with single_flight.disabled():
+            flight.do("key", lambda: calls.append(1))
+    assert len(calls) == 4
+
+
+def test_read_items_single_flight_key(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+) -> None:
+    flight = items.read_items_flight
+    with (
+        patch("app.core.config.settings.SINGLE_FLIGHT_ENABLED", True),
+        patch.object(flight, "do", wraps=flight.do) as do,
+    ):
+        everything = client.get(
+            f"{settings.API_V1_STR}/items/", headers=superuser_token_headers
+        )
+        own = client.get(
+            f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers
+        )
+        me = client.get(
+            f"{settings.API_V1_STR}/users/me", headers=normal_user_token_headers
+        )
+    assert everything.status_code == own.status_code == 200
+    # Users only share the reads of the items they can see
+    superuser_key, user_key = (call.args[0] for call in do.call_args_list)
+    assert superuser_key != user_key
+    assert str(user_key[-2]) == me.json()["id"]
+    assert superuser_key[-2] is None
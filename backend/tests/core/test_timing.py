@@ -0,0 +1,32 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_server_timing_header(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    with patch("app.core.config.settings.SERVER_TIMING_SAMPLE_RATE", 1.0):
+        r = client.get(
+            f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers
+        )
+    assert r.status_code == 200
+    metrics = {
+        metric.split(";")[0]: metric
+        for metric in r.headers["Server-Timing"].split(", ")
+    }
+    assert set(metrics) == {"auth", "db", "handler", "serialize", "total"}
+    assert 'desc="3 queries"' in metrics["db"]
+
+
+def test_server_timing_not_sampled(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    with patch("app.core.config.settings.SERVER_TIMING_SAMPLE_RATE", 0.0):
+        r = client.get(
+            f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers
+        )
+    assert r.status_code == 200
+    assert "Server-Timing" not in r.headers
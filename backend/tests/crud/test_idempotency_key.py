@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session
+
+from app import crud
+from app.models import IdempotencyKey
+from tests.utils.utils import random_lower_string
+
+
+def _key(key: str, response: dict[str, str], **kwargs: datetime) -> IdempotencyKey:
+    return IdempotencyKey(
+        scope="test", key=key, request_hash="hash", response=response, **kwargs
+    )
+
+
+def test_try_save_idempotency_key(db: Session) -> None:
+    key = random_lower_string()
+    now = datetime.now(timezone.utc)
+    expired_before = now - timedelta(hours=1)
+    assert crud.try_save_idempotency_key(
+        session=db,
+        idempotency_key=_key(key, {"id": "1"}),
+        expired_before=expired_before,
+    )
+    assert not crud.try_save_idempotency_key(
+        session=db,
+        idempotency_key=_key(key, {"id": "2"}),
+        expired_before=expired_before,
+    )
+    saved = crud.get_idempotency_key(
+        session=db, scope="test", key=key, created_after=expired_before
+    )
+    assert saved and saved.response == {"id": "1"}
+
+
+def test_try_save_idempotency_key_replaces_expired(db: Session) -> None:
+    key = random_lower_string()
+    now = datetime.now(timezone.utc)
+    expired_before = now - timedelta(hours=1)
+    old = _key(key, {"id": "1"}, created_at=now - timedelta(hours=2))
+    assert crud.try_save_idempotency_key(
+        session=db, idempotency_key=old, expired_before=expired_before
+    )
+    assert (
+        crud.get_idempotency_key(
+            session=db, scope="test", key=key, created_after=expired_before
+        )
+        is None
+    )
+    assert crud.try_save_idempotency_key(
+        session=db,
+        idempotency_key=_key(key, {"id": "2"}),
+        expired_before=expired_before,
+    )
+    saved = crud.get_idempotency_key(
+        session=db, scope="test", key=key, created_after=expired_before
+    )
+    assert saved and saved.response == {"id": "2"}
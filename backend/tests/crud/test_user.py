@@ -1,7 +1,11 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from fastapi.encoders import jsonable_encoder
-from sqlmodel import Session
+from sqlmodel import Session, col, delete, select
 
 from app import crud
+from app.core.db import engine
 from app.core.security import verify_password
 from app.models import User, UserCreate, UserUpdate
 from tests.utils.utils import random_email, random_lower_string
@@ -16,6 +20,60 @@ def test_create_user(db: Session) -> None:
     assert hasattr(user, "hashed_password")
 
 
+def test_try_create_user_existing_email(db: Session) -> None:
+    email = random_email()
+    user_in = UserCreate(email=email, password=random_lower_string())
+    user = crud.try_create_user(session=db, user_create=user_in)
+    assert user and user.email == email
+    assert crud.try_create_user(session=db, user_create=user_in) is None
+
+
+def test_get_user_by_email_case_insensitive(db: Session) -> None:
+    email = random_email()
+    user_in = UserCreate(email=email, password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+    assert crud.get_user_by_email(session=db, email=email.upper()) == user
+    user_in = UserCreate(email=email.upper(), password=random_lower_string())
+    assert crud.try_create_user(session=db, user_create=user_in) is None
+
+
+def test_emails_stored_lower_case(db: Session) -> None:
+    email = random_email()
+    user_in = UserCreate(email=email.upper(), password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+    assert user.email == email
+    new_email = random_email()
+    crud.update_user(
+        session=db, db_user=user, user_in=UserUpdate(email=new_email.upper())
+    )
+    assert user.email == new_email
+
+
+def test_try_create_user_concurrent_signups() -> None:
+    email = random_email()
+    user_in = UserCreate(email=email, password=random_lower_string())
+    workers = 8
+    barrier = threading.Barrier(workers)
+
+    def signup() -> User | None:
+        with Session(engine) as session:
+            barrier.wait()
+            return crud.try_create_user(session=session, user_create=user_in)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda _: signup(), range(workers)))
+        created = [user for user in results if user is not None]
+        assert len(created) == 1
+        with Session(engine) as session:
+            users = session.exec(select(User).where(User.email == email)).all()
+        assert [user.id for user in users] == [created[0].id]
+    finally:
+        with Session(engine) as session:
+            session.exec(delete(User).where(col(User.email) == email))  # type: ignore[call-overload]
+            session.commit()
+
+
 def test_authenticate_user(db: Session) -> None:
     email = random_email()
     password = random_lower_string()
@@ -89,3 +147,4 @@ def test_update_user(db: Session) -> None:
     assert user_2
     assert user.email == user_2.email
     assert verify_password(new_password, user_2.hashed_password)
+    assert user_2.version == 2
@@ -1,19 +1,13 @@
 from unittest.mock import MagicMock, patch
 
-from sqlmodel import select
-
 from app.backend_pre_start import init, logger
 
 
 def test_init_successful_connection() -> None:
     engine_mock = MagicMock()
-
-    session_mock = MagicMock()
-    exec_mock = MagicMock(return_value=True)
-    session_mock.configure_mock(**{"exec.return_value": exec_mock})
+    connection_mock = engine_mock.connect.return_value.__enter__.return_value
 
     with (
-        patch("sqlmodel.Session", return_value=session_mock),
         patch.object(logger, "info"),
         patch.object(logger, "error"),
         patch.object(logger, "warn"),
@@ -28,6 +22,15 @@ def test_init_successful_connection() -> None:
             connection_successful
         ), "The database connection should be successful and not raise an exception."
 
-        assert session_mock.exec.called_once_with(
-            select(1)
-        ), "The session should execute a select statement once."
+        connection_mock.execute.assert_called_once()
+
+
+def test_init_checks_smtp_when_emails_enabled() -> None:
+    with (
+        patch("app.core.config.settings.SMTP_HOST", "smtp.example.com"),
+        patch("app.core.config.settings.EMAILS_FROM_EMAIL", "info@example.com"),
+        patch("socket.create_connection") as create_connection,
+    ):
+        init(MagicMock())
+
+    create_connection.assert_called_once()
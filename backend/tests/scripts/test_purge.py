@@ -0,0 +1,123 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import col, delete, func, insert, select
+
+from app.core.db import engine
+from app.models import IdempotencyKey, Item, ItemEvent, User
+from app.purge import purge_once
+from tests.utils.utils import random_email, random_lower_string
+
+
+def test_purge_once() -> None:
+    now = datetime.now(timezone.utc)
+    deleted_user, active_user = uuid.uuid4(), uuid.uuid4()
+    user_ids = [deleted_user, active_user]
+    # Committed on another connection, the purge runs its own transactions
+    with engine.begin() as connection:
+        connection.execute(
+            insert(User),
+            [
+                {
+                    "id": deleted_user,
+                    "email": random_email(),
+                    "hashed_password": "x",
+                    "deleted_at": now,
+                },
+                {
+                    "id": active_user,
+                    "email": random_email(),
+                    "hashed_password": "x",
+                    "deleted_at": None,
+                },
+            ],
+        )
+        connection.execute(
+            insert(Item),
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "title": "Foo",
+                    "owner_id": owner_id,
+                    "deleted_at": None,
+                }
+                for owner_id in [deleted_user] * 25 + [active_user] * 5
+            ],
+        )
+        connection.execute(
+            insert(Item),
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "title": "Foo",
+                    "owner_id": active_user,
+                    "deleted_at": now,
+                }
+            ],
+        )
+        old_event = connection.execute(
+            insert(ItemEvent)
+            .values(
+                item_id=uuid.uuid4(),
+                owner_id=active_user,
+                type="created",
+                created_at=now - timedelta(days=30),
+            )
+            .returning(col(ItemEvent.id))
+        ).scalar_one()
+        expired_key, fresh_key = random_lower_string(), random_lower_string()
+        connection.execute(
+            insert(IdempotencyKey),
+            [
+                {
+                    "scope": "test",
+                    "key": expired_key,
+                    "request_hash": "x",
+                    "response": {},
+                    "created_at": now - timedelta(days=30),
+                },
+                {
+                    "scope": "test",
+                    "key": fresh_key,
+                    "request_hash": "x",
+                    "response": {},
+                    "created_at": now,
+                },
+            ],
+        )
+    try:
+        purged = purge_once(engine, batch_size=10, pause_seconds=0)
+
+        assert purged == 25 + 1 + 1 + 1 + 1
+        with engine.connect() as connection:
+            users = connection.execute(
+                select(User.id).where(col(User.id).in_(user_ids))
+            ).all()
+            items = connection.execute(
+                select(func.count())
+                .select_from(Item)
+                .where(col(Item.owner_id).in_(user_ids))
+            ).one()
+            keys = connection.execute(
+                select(IdempotencyKey.key).where(
+                    col(IdempotencyKey.key).in_([expired_key, fresh_key])
+                )
+            ).all()
+            events = connection.execute(
+                select(ItemEvent.id).where(col(ItemEvent.owner_id).in_(user_ids))
+            ).all()
+        assert users == [(active_user,)]
+        assert items == (5,)
+        # Only the events older than the retention are purged
+        assert len(events) == 25 + 5 + 1
+        assert (old_event,) not in events
+        assert keys == [(fresh_key,)]
+    finally:
+        with engine.begin() as connection:
+            connection.execute(delete(User).where(col(User.id).in_(user_ids)))
+            connection.execute(
+                delete(ItemEvent).where(col(ItemEvent.owner_id).in_(user_ids))
+            )
+            connection.execute(
+                delete(IdempotencyKey).where(col(IdempotencyKey.key) == fresh_key)
+            )
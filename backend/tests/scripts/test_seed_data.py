@@ -0,0 +1,55 @@
+import random
+from collections import Counter
+
+from sqlmodel import Session, col, delete, func, select
+
+from app.core.db import engine
+from app.core.security import verify_password
+from app.models import Item, ItemEvent, User
+from app.seed_data import generate_users, owner_picker, seed_database
+
+
+def test_seed_database(db: Session) -> None:
+    user_ids = seed_database(
+        engine, users=20, items=200, seed=1234, distribution="zipf"
+    )
+    try:
+        users = db.exec(select(User).where(col(User.id).in_(user_ids))).all()
+        assert len(users) == 20
+        assert verify_password("seeded-password", users[0].hashed_password)
+
+        counts = db.exec(
+            select(func.count())
+            .select_from(Item)
+            .where(col(Item.owner_id).in_(user_ids))
+            .group_by(Item.owner_id)
+        ).all()
+        assert sum(counts) == 200
+        # Seeding doesn't record item events
+        events = db.exec(
+            select(func.count())
+            .select_from(ItemEvent)
+            .where(col(ItemEvent.owner_id).in_(user_ids))
+        ).one()
+        assert events == 0
+    finally:
+        # The rows were committed on another connection
+        with engine.begin() as connection:
+            connection.execute(delete(User).where(col(User.id).in_(user_ids)))
+
+
+def test_generated_rows_are_deterministic() -> None:
+    first = list(generate_users(random.Random(7), 10, 7, "hash"))
+    second = list(generate_users(random.Random(7), 10, 7, "hash"))
+    assert first == second
+    assert len({row[1] for row in first}) == 10
+
+
+def test_zipf_owner_distribution_is_skewed() -> None:
+    rng = random.Random(0)
+    user_ids = [row[0] for row in generate_users(rng, 100, 0, "hash")]
+    pick_owner = owner_picker(rng, user_ids, "zipf")
+
+    owners = Counter(pick_owner() for _ in range(10_000))
+
+    assert owners[user_ids[0]] > 10 * owners[user_ids[50]]
@@ -1,33 +1,35 @@
 from unittest.mock import MagicMock, patch
 
-from sqlmodel import select
+import pytest
 
-from app.tests_pre_start import init, logger
+from app.core.db import engine
+from app.tests_pre_start import init
 
 
 def test_init_successful_connection() -> None:
-    engine_mock = MagicMock()
+    # The test database is migrated to the latest revision
+    init(engine)
 
-    session_mock = MagicMock()
-    exec_mock = MagicMock(return_value=True)
-    session_mock.configure_mock(**{"exec.return_value": exec_mock})
 
+def test_init_fails_when_not_migrated() -> None:
     with (
-        patch("sqlmodel.Session", return_value=session_mock),
-        patch.object(logger, "info"),
-        patch.object(logger, "error"),
-        patch.object(logger, "warn"),
+        patch("app.core.readiness.MAX_WAIT_SECONDS", 0),
+        patch(
+            "app.core.readiness.MigrationContext.configure",
+            return_value=MagicMock(**{"get_current_heads.return_value": ()}),
+        ),
+        pytest.raises(RuntimeError, match="expected"),
     ):
-        try:
-            init(engine_mock)
-            connection_successful = True
-        except Exception:
-            connection_successful = False
-
-        assert (
-            connection_successful
-        ), "The database connection should be successful and not raise an exception."
-
-        assert session_mock.exec.called_once_with(
-            select(1)
-        ), "The session should execute a select statement once."
+        init(engine)
+
+
+def test_init_without_migrations() -> None:
+    # A schema created with create_all has no Alembic revision
+    with (
+        patch("app.core.config.settings.TESTS_WAIT_FOR_MIGRATIONS", False),
+        patch(
+            "app.core.readiness.MigrationContext.configure",
+            return_value=MagicMock(**{"get_current_heads.return_value": ()}),
+        ),
+    ):
+        init(engine)
@@ -0,0 +1,52 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+BUDGET = json.loads((Path(__file__).parent / "import_budget.json").read_text())
+
+# Loaded on first use, see app/main.py and app/utils.py
+LAZY_MODULES = ["sentry_sdk", "emails", "jinja2"]
+
+MEASURE_IMPORT = """
+import json, sys, time, tracemalloc
+if sys.argv[1] == "memory":
+    tracemalloc.start()
+start = time.perf_counter()
+import app.main
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "peak_memory_mb": tracemalloc.get_traced_memory()[1] / 2**20,
+    "modules": [name for name in sys.modules if name.split(".")[0] in sys.argv[2:]],
+}))
+"""
+
+
+def measure_import(mode: str) -> dict[str, Any]:
+    # A fresh interpreter, the test session has already imported everything
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE_IMPORT, mode, *LAZY_MODULES],
+        capture_output=True,
+        check=True,
+        cwd=Path(__file__).parents[1],
+        text=True,
+    )
+    return json.loads(result.stdout)  # type: ignore[no-any-return]
+
+
+def test_import_time_within_budget() -> None:
+    seconds = min(measure_import("time")["seconds"] for _ in range(3))
+    assert seconds <= BUDGET["seconds"], (
+        f"Importing app.main took {seconds:.2f}s, over the {BUDGET['seconds']}s "
+        "budget, see scripts/import-time.sh"
+    )
+
+
+def test_import_memory_within_budget() -> None:
+    result = measure_import("memory")
+    assert result["peak_memory_mb"] <= BUDGET["peak_memory_mb"], (
+        f"Importing app.main allocated {result['peak_memory_mb']:.1f}MB, over the "
+        f"{BUDGET['peak_memory_mb']}MB budget"
+    )
+    assert result["modules"] == []
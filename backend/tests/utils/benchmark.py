@@ -0,0 +1,134 @@
+import json
+import platform
+import statistics
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+from httpx import Response
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class BenchmarkSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="BENCHMARK_", extra="ignore")
+
+    ENABLED: bool = False
+    USERS: int = 100
+    ITEMS_PER_USER: int = 100
+    ROUNDS: int = 50
+    WARMUP_ROUNDS: int = 5
+    PAGE_SIZE: int = 100
+    PAGE_DEPTHS: list[int] = [0, 1_000, 5_000]
+    OUTPUT: Path = Path("benchmark-results.json")
+    BASELINE: Path = Path(__file__).parent.parent / "benchmarks" / "baseline.json"
+    SAVE_BASELINE: bool = False
+    # Allowed slowdown relative to the baseline before a benchmark fails
+    TOLERANCE: float = 0.25
+
+
+benchmark_settings = BenchmarkSettings()
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    rounds: int
+    total_seconds: float
+    throughput: float
+    mean_ms: float
+    min_ms: float
+    max_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+def summarize(name: str, latencies: list[float]) -> BenchmarkResult:
+    total = sum(latencies)
+    ms = [latency * 1000 for latency in latencies]
+    cut_points = statistics.quantiles(ms, n=100, method="inclusive")
+    return BenchmarkResult(
+        name=name,
+        rounds=len(latencies),
+        total_seconds=total,
+        throughput=len(latencies) / total if total else 0.0,
+        mean_ms=statistics.fmean(ms),
+        min_ms=min(ms),
+        max_ms=max(ms),
+        p50_ms=cut_points[49],
+        p95_ms=cut_points[94],
+        p99_ms=cut_points[98],
+    )
+
+
+def run_benchmark(
+    name: str,
+    call: Callable[[Any], Response],
+    *,
+    setup: Callable[[], Any] | None = None,
+    expected_status: int = 200,
+) -> BenchmarkResult:
+    """
+    Time `call` over the configured number of rounds.
+
+    `setup` runs before every round, outside of the timed section, and its
+    return value is passed to `call`. Use it for requests that consume state,
+    like deletes.
+    """
+    rounds = max(benchmark_settings.ROUNDS, 2)
+    latencies: list[float] = []
+    for i in range(benchmark_settings.WARMUP_ROUNDS + rounds):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        response = call(arg)
+        elapsed = time.perf_counter() - start
+        assert (
+            response.status_code == expected_status
+        ), f"{name}: unexpected status {response.status_code}: {response.text}"
+        if i >= benchmark_settings.WARMUP_ROUNDS:
+            latencies.append(elapsed)
+    return summarize(name, latencies)
+
+
+def load_baseline(path: Path) -> dict[str, dict[str, Any]]:
+    if not path.exists():
+        return {}
+    results: dict[str, dict[str, Any]] = json.loads(path.read_text())["results"]
+    return results
+
+
+def compare_to_baseline(
+    result: BenchmarkResult, baseline: dict[str, dict[str, Any]]
+) -> list[str]:
+    """
+    Return a description of every percentile that regressed beyond the tolerance.
+    """
+    reference = baseline.get(result.name)
+    if not reference:
+        return []
+    regressions = []
+    for metric in ("p50_ms", "p95_ms"):
+        allowed = reference[metric] * (1 + benchmark_settings.TOLERANCE)
+        current = getattr(result, metric)
+        if current > allowed:
+            regressions.append(
+                f"{result.name} {metric}: {current:.2f} > {allowed:.2f} "
+                f"(baseline {reference[metric]:.2f})"
+            )
+    return regressions
+
+
+def write_results(path: Path, results: list[BenchmarkResult]) -> None:
+    payload = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "users": benchmark_settings.USERS,
+            "items_per_user": benchmark_settings.ITEMS_PER_USER,
+            "rounds": benchmark_settings.ROUNDS,
+        },
+        "results": {result.name: asdict(result) for result in results},
+    }
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n")